@@ -0,0 +1,320 @@
+"""
+Headless REST scoring service for the churn model.
+
+Reuses the artifact loader and the table-driven encoder of the Streamlit app, without
+running any of the UI. Each worker process loads the model at startup, then checks every
+MODEL_RELOAD_SECONDS whether another version was published (train.py) and swaps it in;
+requests already running finish on the model they started with.
+
+    python api.py --workers 4 --port 8000
+
+Endpoints:
+    POST /predict        one client as a JSON object
+    POST /predict/batch  a JSON array of clients, or an NDJSON stream
+                         (Content-Type: application/x-ndjson) answered as NDJSON
+    Both predict endpoints accept ?explain=N to add the N top drivers of each client.
+    GET  /health         model path and fingerprint
+    GET  /metrics        Prometheus text format counters and latency summaries
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import telemetry
+from artifact import default_model_path, load_scorer, path_version
+from cache import ScoreCache, file_fingerprint
+from encoder import EncodingError
+from scoring import DEFAULT_THRESHOLD, ENCODER, FEATURE_COLUMNS, explain_matrix, predict_client
+
+NDJSON_CHUNK_SIZE = int(os.environ.get('API_NDJSON_CHUNK_SIZE', '10000'))
+MAX_BATCH_ROWS = int(os.environ.get('API_MAX_BATCH_ROWS', '1000000'))
+MODEL_RELOAD_SECONDS = float(os.environ.get('MODEL_RELOAD_SECONDS', '5'))  # 0 : pas de rechargement
+
+logger = telemetry.get_logger('clientinsight.api')
+
+
+# --- Model State (one per worker process) ---
+class ModelState:
+    def __init__(self, path, mtime=None, fingerprint=None):
+        self.path = path
+        self.mtime = os.path.getmtime(path) if mtime is None else mtime
+        self.fingerprint = file_fingerprint(path) if fingerprint is None else fingerprint
+        self.scorer = load_scorer(path)
+        self.cache = ScoreCache(self.fingerprint)
+        self.loaded_at = time.time()
+
+
+async def current_model(app):
+    """
+    The worker's model state, replaced when the resolved model file changes. The check
+    runs at most every MODEL_RELOAD_SECONDS, in the thread pool so reading and loading
+    the artifact never blocks the event loop; a version that fails to load is skipped
+    and the previous model keeps serving.
+    """
+    now = time.monotonic()
+    if MODEL_RELOAD_SECONDS <= 0 or now - app.state.model_checked_at < MODEL_RELOAD_SECONDS:
+        return app.state.model
+    app.state.model_checked_at = now  # Concurrent requests keep the current model meanwhile
+    return await run_in_threadpool(reload_model, app)
+
+
+def reload_model(app):
+    """
+    Load the resolved model file if its contents differ from the model being served;
+    returns the state to use. A touched or re-pointed file with the same contents is
+    only recorded, so the next check does not hash it again.
+    """
+    state = app.state.model
+    path = app.state.model_path()
+    try:
+        mtime = os.path.getmtime(path)
+        if path == state.path and mtime == state.mtime:
+            return state
+        fingerprint = file_fingerprint(path)
+        if fingerprint == state.fingerprint:
+            state.path, state.mtime = path, mtime
+            return state
+        fresh = ModelState(path, mtime, fingerprint)
+    except Exception as e:
+        telemetry.increment('model_reloads', result='failed')
+        logger.warning("Échec du rechargement du modèle", extra={'fields': {'path': path, 'error': str(e)}})
+        return state
+    app.state.model = fresh
+    telemetry.increment('model_reloads', result='swapped')
+    logger.info("Nouveau modèle chargé", extra={'fields': {'path': path, 'fingerprint': fingerprint[:12]}})
+    return fresh
+
+
+# --- Metrics ---
+class Metrics:
+    """
+    Request metrics of the worker process, recorded in the shared telemetry registry so
+    /metrics also carries the model load, preprocessing, scoring and cache series.
+    """
+
+    def __init__(self, registry=telemetry.REGISTRY):
+        self.registry = registry
+        registry.describe('api_requests', "Requêtes traitées, par point d'accès.")
+        registry.describe('api_errors', "Requêtes terminées en erreur, par point d'accès.")
+        registry.describe('api_request_seconds', "Durée de traitement des requêtes, par point d'accès.")
+        registry.describe('api_rows_scored', "Clients scorés.")
+
+    def observe(self, endpoint, elapsed, rows=0, error=False):
+        self.registry.increment('api_requests', endpoint=endpoint)
+        self.registry.observe('api_request_seconds', elapsed, endpoint=endpoint)
+        if error:
+            self.registry.increment('api_errors', endpoint=endpoint)
+        if rows:
+            self.registry.increment('api_rows_scored', rows)
+
+    def render(self, cache_stats):
+        lines = [self.registry.render_prometheus().rstrip("\n"),
+                 f"# HELP {telemetry.METRIC_PREFIX}score_cache Score cache counters.",
+                 f"# TYPE {telemetry.METRIC_PREFIX}score_cache gauge"]
+        lines += [f'{telemetry.METRIC_PREFIX}score_cache{{stat="{k}"}} {v}' for k, v in cache_stats.items()]
+        return "\n".join(line for line in lines if line) + "\n"
+
+
+# --- Helpers ---
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse without the concurrent disconnect listener: that listener reads
+    from `receive`, which would steal the request body chunks the generator is still
+    consuming while it streams results back.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def parse_threshold(request):
+    threshold = float(request.query_params.get('threshold', DEFAULT_THRESHOLD))
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError("Le seuil doit être compris entre 0 et 1.")
+    return threshold
+
+
+def parse_explain(request):
+    explain = int(request.query_params.get('explain', 0))
+    if not 0 <= explain <= len(FEATURE_COLUMNS):
+        raise ValueError(f"explain doit être compris entre 0 et {len(FEATURE_COLUMNS)}.")
+    return explain
+
+
+def score_records(scorer, records, threshold, explain=0):
+    """
+    Encode and score a list of client dicts in one vectorized call; with `explain`,
+    each result also lists its top drivers (feature and log-odds contribution).
+    """
+    for position, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Client n°{position + 1} : chaque client doit être un objet JSON.")
+    with telemetry.timed('preprocess_seconds', path='api'):
+        X = ENCODER.encode_records(records)
+    if not explain:
+        with telemetry.timed('score_seconds', path='batch'):
+            churn_proba = scorer.predict_proba(X)[:, 1]
+        return [{"prediction": int(p >= threshold), "churn_probability": float(p)} for p in churn_proba]
+    churn_proba, names, impacts = explain_matrix(scorer, X, explain)
+    return [{"prediction": int(p >= threshold), "churn_probability": float(p),
+             "drivers": [{"feature": f, "contribution": float(c)} for f, c in zip(row_names, row_impacts)]}
+            for p, row_names, row_impacts in zip(churn_proba, names, impacts)]
+
+
+def error_response(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+# --- Endpoints ---
+async def predict(request):
+    start = time.perf_counter()
+    state = await current_model(request.app)
+    try:
+        threshold = parse_threshold(request)
+        explain = parse_explain(request)
+        record = await request.json()
+        if not isinstance(record, dict):
+            raise ValueError("Le corps de la requête doit être un objet JSON décrivant un client.")
+        with telemetry.timed('preprocess_seconds', path='api'):
+            X = ENCODER.encode_records([record])
+        result = predict_client(state.scorer, X, threshold, cache=state.cache, explain=explain)
+        if explain:
+            result["drivers"] = [{"feature": d["feature"], "contribution": d["contribution"]} for d in result["drivers"]]
+    except EncodingError as e:
+        request.app.state.metrics.observe('predict', time.perf_counter() - start, error=True)
+        return error_response(str(e), 422)
+    except ValueError as e:
+        request.app.state.metrics.observe('predict', time.perf_counter() - start, error=True)
+        return error_response(str(e), 400)
+    request.app.state.metrics.observe('predict', time.perf_counter() - start, rows=1)
+    return JSONResponse(result)
+
+
+async def predict_batch(request):
+    start = time.perf_counter()
+    state = await current_model(request.app)
+    metrics = request.app.state.metrics
+    try:
+        threshold = parse_threshold(request)
+        explain = parse_explain(request)
+    except ValueError as e:
+        metrics.observe('predict_batch', time.perf_counter() - start, error=True)
+        return error_response(str(e), 400)
+
+    if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+        return BodyStreamingResponse(stream_ndjson(request, state, threshold, start, explain),
+                                     media_type='application/x-ndjson')
+
+    try:
+        records = await request.json()
+        if not isinstance(records, list):
+            raise ValueError("Le corps de la requête doit être un tableau JSON de clients.")
+        if len(records) > MAX_BATCH_ROWS:
+            raise ValueError(f"Lot trop volumineux : {len(records)} lignes (maximum {MAX_BATCH_ROWS}).")
+        results = await run_in_threadpool(score_records, state.scorer, records, threshold, explain) if records else []
+    except EncodingError as e:
+        metrics.observe('predict_batch', time.perf_counter() - start, error=True)
+        return error_response(str(e), 422)
+    except ValueError as e:
+        metrics.observe('predict_batch', time.perf_counter() - start, error=True)
+        return error_response(str(e), 400)
+    metrics.observe('predict_batch', time.perf_counter() - start, rows=len(results))
+    return JSONResponse({"results": results})
+
+
+async def stream_ndjson(request, state, threshold, start, explain=0):
+    """
+    Read NDJSON clients incrementally and answer one NDJSON line per client, scoring
+    NDJSON_CHUNK_SIZE lines at a time so memory stays bounded by the chunk.
+    An invalid chunk produces a single {"error": ...} line and ends the stream.
+    """
+    metrics = request.app.state.metrics
+    buffer = b''
+    records = []
+    rows = 0
+
+    async def flush():
+        results = await run_in_threadpool(score_records, state.scorer, records, threshold, explain)
+        records.clear()
+        return ''.join(json.dumps(result) + '\n' for result in results), len(results)
+
+    try:
+        async for body in request.stream():
+            buffer += body
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line.strip():
+                    records.append(json.loads(line))
+                if len(records) >= NDJSON_CHUNK_SIZE:
+                    text, scored = await flush()
+                    rows += scored  # Only once the chunk is scored, so a rejected chunk is not counted
+                    yield text
+        if buffer.strip():
+            records.append(json.loads(buffer))
+        if records:
+            text, scored = await flush()
+            rows += scored
+            yield text
+    except ValueError as e:
+        metrics.observe('predict_batch', time.perf_counter() - start, rows=rows, error=True)
+        yield json.dumps({"error": str(e)}) + '\n'
+        return
+    metrics.observe('predict_batch', time.perf_counter() - start, rows=rows)
+
+
+async def health(request):
+    state = await current_model(request.app)
+    return JSONResponse({
+        "status": "ok",
+        "model_path": state.path,
+        "model_fingerprint": state.fingerprint,
+        "model_version": path_version(state.path),
+        "loaded_at": state.loaded_at,
+        "pid": os.getpid(),
+    })
+
+
+async def metrics(request):
+    body = request.app.state.metrics.render((await current_model(request.app)).cache.stats())
+    return PlainTextResponse(body, media_type='text/plain; version=0.0.4')
+
+
+def create_app(model_path=None):
+    """Build the ASGI app; the model is loaded once here, per worker process."""
+    app = Starlette(routes=[
+        Route('/predict', predict, methods=['POST']),
+        Route('/predict/batch', predict_batch, methods=['POST']),
+        Route('/health', health, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ])
+    # An explicit path is reloaded when the file changes; otherwise the published version is followed.
+    app.state.model_path = (lambda: model_path) if model_path else default_model_path
+    app.state.model = ModelState(app.state.model_path())
+    app.state.model_checked_at = time.monotonic()
+    app.state.metrics = Metrics()
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Service REST de scoring du désabonnement.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="Nombre de processus (chacun charge le modèle une fois)")
+    args = parser.parse_args(argv)
+    uvicorn.run('api:create_app', factory=True, host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,169 +1,40 @@
 import streamlit as st
+from rerun_timing import RERUN_TIMING_ENABLED, RunTimer, summary as rerun_summary
+run_timer = RunTimer() # Coût de chaque passage du script, phase par phase
 import pandas as pd
-import pickle
 import time
 import os
 from streamlit_option_menu import option_menu
-import base64
 import tempfile
-import json
-
-# --- New Chatbot Imports ---
-from groq import Groq
+import hmac
+import telemetry
+from cache import ScoreCache, file_fingerprint
+from artifact import ArtifactError, default_model_path, load_scorer
+from scoring import predict_client, sweep_client, DEFAULT_THRESHOLD, ENCODER, SWEEP_DOMAINS, SWEEP_LABELS
+from batch import score_file, detect_format, DEFAULT_CHUNK_SIZE
+
+# Les modules du chatbot (client HTTP, transcription, tâches de fond, enregistreur) ne sont
+# importés qu'à la première ouverture de son onglet : la page de prédiction ne paie pas leur coût.
 # load_dotenv() # Retiré car nous utilisons st.secrets pour la clé GROQ
-import pyttsx3 # For text-to-speech, keep this if you want it
-# --- End New Chatbot Imports ---
-
-# --- Custom Streamlit Component for Audio Recording ---
-def audio_recorder_component():
-    """
-    Streamlit component to record audio in the browser and return it as base64.
-    """
-    # Define the component name used in JavaScript's postMessage
-    component_name = "audio_recorder_custom_component"
-
-    st.components.v1.html(
-        f"""
-        <style>
-        .audio-recorder-container {{
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            padding: 10px;
-            border-radius: 8px;
-            background-color: #262730;
-            margin-top: 10px;
-        }}
-        .audio-recorder-button {{
-            background-color: #FF4B4B;
-            color: white;
-            border: none;
-            border-radius: 50%;
-            width: 45px;
-            height: 45px;
-            font-size: 18px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            cursor: pointer;
-            transition: background-color 0.3s ease, transform 0.1s ease;
-            box-shadow: 0 2px 5px rgba(0, 0, 0, 0.2);
-        }}
-        .audio-recorder-button:hover {{
-            background-color: #E63B3B;
-            transform: scale(1.05);
-        }}
-        .audio-recorder-button:active {{
-            transform: scale(0.95);
-        }}
-        .audio-recorder-button.recording {{
-            background-color: #28a745;
-            animation: pulse 1.5s infinite;
-        }}
-        .audio-recorder-status {{
-            margin-top: 8px;
-            font-size: 0.8em;
-            color: #ccc;
-        }}
-        @keyframes pulse {{
-            0% {{ box-shadow: 0 0 0 0 rgba(40, 167, 69, 0.7); }}
-            70% {{ box-shadow: 0 0 0 10px rgba(40, 167, 69, 0); }}
-            100% {{ box-shadow: 0 0 0 0 rgba(40, 167, 69, 0); }}
-        }}
-        </style>
-        <div class="audio-recorder-container">
-            <button id="recordButton" class="audio-recorder-button">🎤</button>
-            <div id="status" class="audio-recorder-status">Appuyez pour enregistrer</div>
-        </div>
-
-        <script>
-            const recordButton = document.getElementById('recordButton');
-            const statusDiv = document.getElementById('status');
-            let mediaRecorder;
-            let audioChunks = [];
-            let isRecording = false;
-
-            function sendAudioToStreamlit(data) {{ // Doubled {{
-                if (window.parent.streamlitReportReady) {{ // Doubled {{
-                    window.parent.streamlitReportReady();
-                }} // Doubled }}
-                console.log("Sending data to Streamlit. Data length:", data ? data.length : 0); // DEBUG JS
-                window.parent.postMessage({{ // Doubled {{
-                    type: 'streamlit:setComponentValue',
-                    componentName: '{component_name}',
-                    value: data,
-                }}, '*'); // Doubled }}
-            }} // Doubled }}
-
-            recordButton.onclick = async () => {{ // Doubled {{
-                if (!isRecording) {{ // Doubled {{
-                    isRecording = true;
-                    recordButton.classList.add('recording');
-                    recordButton.innerHTML = '🛑';
-                    statusDiv.innerText = 'Enregistrement... Appuyez pour arrêter.';
-                    audioChunks = [];
-
-                    try {{ // Doubled {{
-                        const stream = await navigator.mediaDevices.getUserMedia({{ audio: true }}); // Doubled {{
-                        // Ensure audio/webm is supported, fallback if needed
-                        const mimeType = MediaRecorder.isTypeSupported('audio/webm') ? 'audio/webm' :
-                                       MediaRecorder.isTypeSupported('audio/mp4') ? 'audio/mp4' :
-                                       'audio/ogg'; // Fallback to a common type
-                        
-                        console.log("Using MIME type for recording:", mimeType); // DEBUG JS
-                        mediaRecorder = new MediaRecorder(stream, {{ mimeType: mimeType }}); // Doubled {{
-
-                        mediaRecorder.ondataavailable = event => {{ // Doubled {{
-                            audioChunks.push(event.data);
-                        }}; // Doubled }}
-
-                        mediaRecorder.onstop = async () => {{ // Doubled {{
-                            const audioBlob = new Blob(audioChunks, {{ type: mimeType }}); // Doubled {{
-                            const reader = new FileReader();
-                            reader.readAsDataURL(audioBlob);
-                            reader.onloadend = () => {{ // Doubled {{
-                                const base64data = reader.result.split(',')[1];
-                                console.log("Audio recorded. Base64 length:", base64data ? base64data.length : 0); // DEBUG JS
-                                sendAudioToStreamlit(base64data);
-                            }}; // Doubled }}
-                            stream.getTracks().forEach(track => track.stop());
-                        }}; // Doubled }}
-
-                        mediaRecorder.start();
-                    }} catch (err) {{ // Doubled {{
-                        console.error('Error accessing microphone or media recording:', err); // DEBUG JS
-                        statusDiv.innerText = 'Erreur: Accès micro refusé ou impossible. Vérifiez les permissions de votre navigateur.';
-                        isRecording = false;
-                        recordButton.classList.remove('recording');
-                        recordButton.innerHTML = '🎤';
-                    }} // Doubled }}
-
-                }} else {{ // Doubled {{
-                    isRecording = false;
-                    recordButton.classList.remove('recording');
-                    recordButton.innerHTML = '🎤';
-                    statusDiv.innerText = 'Appuyez pour enregistrer';
-                    if (mediaRecorder && mediaRecorder.state === 'recording') {{ // Doubled {{
-                        mediaRecorder.stop();
-                    }} // Doubled }}
-                }} // Doubled }}
-            }}; // Doubled }}
-        </script>
-        """,
-        height=100,
-        scrolling=False
-    )
-    # Return the value from session_state using the defined component_name
-    return st.session_state.get(component_name, None)
 
-# --- End Custom Streamlit Component ---
+logger = telemetry.get_logger('clientinsight.app') # Messages de diagnostic filtrés par LOG_LEVEL, jamais affichés aux utilisateurs
+run_timer.mark("imports")
+
+def rerun():
+    """st.rerun() that first records the timing of the run it interrupts."""
+    run_timer.finish("rerun")
+    st.rerun()
 
 # --- Function to Inject Custom CSS ---
+# The stylesheet is read once per file version (mtime) instead of on every rerun.
+@st.cache_data
+def load_css(file_path, mtime):
+    with open(file_path) as f:
+        return f'<style>{f.read()}</style>'
+
 def inject_css(file_path):
     try:
-        with open(file_path) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+        st.markdown(load_css(file_path, os.path.getmtime(file_path)), unsafe_allow_html=True)
     except FileNotFoundError:
         st.error(f"Erreur CSS: Le fichier '{file_path}' est introuvable. Assurez-vous qu'il est dans le même répertoire.")
         st.stop()
@@ -180,45 +51,67 @@ st.set_page_config(
 )
 
 inject_css('style.css')
+run_timer.mark("css")
 
 # --- Load Machine Learning Model (Cached for Performance) ---
-@st.cache_resource
-def load_model():
+# The versioned .npz artifact loads without sklearn; the pickle is only a fallback.
+# The path is resolved on every run, so a version published by train.py (or a rollback)
+# is picked up by the next interaction without restarting the server.
+MODEL_PATH = default_model_path()
+SCORE_CACHE_DB = os.environ.get('SCORE_CACHE_DB', 'score_cache.sqlite') # Chaîne vide : cache disque désactivé
+
+@st.cache_data
+def model_fingerprint(path, mtime):
+    return file_fingerprint(path)
+
+def current_model_fingerprint():
+    try:
+        return model_fingerprint(MODEL_PATH, os.path.getmtime(MODEL_PATH))
+    except OSError:
+        return None # load_model affichera l'erreur
+
+# The fingerprint argument only keys the caches: a new model file reloads the scorer
+# and opens a fresh score cache.
+@st.cache_resource(max_entries=1)
+def load_model(fingerprint):
     try:
-        with open('model.pkl', 'rb') as file:
-            model = pickle.load(file)
-        return model
+        return load_scorer(MODEL_PATH)
     except FileNotFoundError:
-        st.error("Erreur Modèle: Le fichier 'model.pkl' est introuvable. Assurez-vous qu'il est dans le même répertoire que 'app.py'.")
+        st.error(f"Erreur Modèle: Le fichier '{MODEL_PATH}' est introuvable. Assurez-vous qu'il est dans le même répertoire que 'app.py'.")
+        st.stop()
+    except ArtifactError as e:
+        st.error(f"Erreur Modèle: Artefact '{MODEL_PATH}' invalide. Régénérez-le avec 'python artifact.py export'. Erreur: {e}")
         st.stop()
     except Exception as e:
-        st.error(f"Erreur Modèle: Impossible de charger le modèle. Vérifiez que 'model.pkl' est un fichier pickle valide. Erreur: {e}")
+        st.error(f"Erreur Modèle: Impossible de charger le modèle depuis '{MODEL_PATH}'. Erreur: {e}")
         st.stop()
 
-model = load_model()
+@st.cache_resource(max_entries=1)
+def load_score_cache(fingerprint):
+    try:
+        return ScoreCache(fingerprint, db_path=SCORE_CACHE_DB or None)
+    except Exception as e:
+        st.warning(f"Cache disque indisponible ({e}), utilisation du cache mémoire uniquement.")
+        return ScoreCache(fingerprint)
+
+model_version = current_model_fingerprint()
+scorer = load_model(model_version)
+score_cache = load_score_cache(model_version)
+run_timer.mark("model")
 
 # --- Preprocessing Function for Model Input ---
+# Lookup tables and valid ranges come from encoder_spec.json, shared with batch.py and the API.
 def preprocess_input(credit_score, geography_display, gender_display, age, tenure, balance,
                      num_products, has_cr_card, is_active_member, estimated_salary):
     try:
-        gender_encoded = 0 if gender_display == 'Homme' else 1
-        if geography_display == 'France':
-            geography_encoded = 0.5014
-        elif geography_display == 'Allemagne':
-            geography_encoded = 0.2509
-        else: # 'Espagne'
-            geography_encoded = 0.2477
-
-        has_cr_card_encoded = 1 if has_cr_card == 'Oui' else 0
-        is_active_member_encoded = 1 if is_active_member == 'Oui' else 0
-
-        input_data = pd.DataFrame([[
-            credit_score, geography_encoded, gender_encoded, age, tenure, balance,
-            num_products, has_cr_card_encoded, is_active_member_encoded, estimated_salary
-        ]], columns=['CreditScore', 'Geography', 'Gender', 'Age', 'Tenure', 'Balance',
-                     'NumOfProducts', 'HasCrCard', 'IsActiveMember', 'EstimatedSalary'])
-        return input_data
+        with telemetry.timed('preprocess_seconds', path='form'):
+            return ENCODER.encode_row(
+                CreditScore=credit_score, Geography=geography_display, Gender=gender_display,
+                Age=age, Tenure=tenure, Balance=balance, NumOfProducts=num_products,
+                HasCrCard=has_cr_card, IsActiveMember=is_active_member, EstimatedSalary=estimated_salary
+            )
     except Exception as e:
+        logger.warning("Échec du prétraitement du formulaire", extra={'fields': {'error': str(e)}})
         st.error(f"Erreur Prétraitement: Impossible de prétraiter les données d'entrée. Erreur: {e}")
         return None
 
@@ -235,7 +128,7 @@ selected = option_menu(
     menu_title=None,
     options=["Prédiction de Désabonnement", "Chatbot d'Assistance"],
     icons=["graph-up", "chat-text"],
-    default_index=0,
+    default_index=1 if st.query_params.get("page") == "chatbot" else 0, # Lien direct : ?page=chatbot
     orientation="horizontal",
     styles={
         "container": {"padding": "0!important", "background-color": "var(--background-dark)", "margin-bottom": "2rem"},
@@ -262,15 +155,27 @@ selected = option_menu(
     }
 )
 
+run_timer.mark("header")
+
 if selected == "Prédiction de Désabonnement":
     if "prediction_result" not in st.session_state:
         st.session_state.prediction_result = None
     if "prediction_message" not in st.session_state:
         st.session_state.prediction_message = None
 
+    TOP_DRIVERS = 5
+    CHURN_MESSAGE = "Action Requise : Ce client présente un risque significatif de désabonnement. Une intervention rapide (offre personnalisée, contact proactif) est cruciale pour la rétention."
+    STABLE_MESSAGE = "Bonne nouvelle : Ce client est stable. Continuez à maintenir une relation positive pour assurer sa satisfaction et sa fidélité."
+
     st.markdown("<h3><svg viewBox='0 0 24 24' width='30' height='30' fill='none' stroke='currentColor' stroke-width='2' stroke-linecap='round' stroke-linejoin='round'><path d='M22 12h-4l-3 9L9 3l-3 9H2'></path></svg>Outil de Prédiction Client</h3>", unsafe_allow_html=True)
     st.markdown("<p style='color: var(--secondary-color); margin-bottom: 2rem; text-align: center;'>Entrez les détails du client ci-dessous pour analyser le risque de désabonnement.</p>", unsafe_allow_html=True)
 
+    decision_threshold = st.slider(
+        "Seuil de décision (probabilité de désabonnement)", 0.0, 1.0, DEFAULT_THRESHOLD, 0.01,
+        key="decision_threshold",
+        help="Un client est classé à risque lorsque sa probabilité de désabonnement atteint ce seuil."
+    )
+
     if st.session_state.prediction_result is not None:
         result = st.session_state.prediction_result
         message = st.session_state.prediction_message
@@ -280,20 +185,68 @@ if selected == "Prédiction de Désabonnement":
 
         if "error" in result and result["error"]:
             st.error(message)
-        elif result["prediction"] == 1:
+        elif result["churn_probability"] >= decision_threshold:
             st.markdown(f"<p class='churn-risk'>💔 Risque ÉLEVÉ de Désabonnement !</p>", unsafe_allow_html=True)
-            st.markdown(f"<p class='probability'>Probabilité estimée : <strong>{(result['probability'] * 100):.2f}%</strong></p>", unsafe_allow_html=True)
-            st.warning(message)
+            st.markdown(f"<p class='probability'>Probabilité de désabonnement : <strong>{(result['churn_probability'] * 100):.2f}%</strong></p>", unsafe_allow_html=True)
+            st.warning(CHURN_MESSAGE)
         else:
             st.markdown(f"<p class='no-churn-risk'>✅ Faible Risque de Désabonnement</p>", unsafe_allow_html=True)
-            st.markdown(f"<p class='probability'>Probabilité estimée : <strong>{(result['probability'] * 100):.2f}%</strong></p>", unsafe_allow_html=True)
-            st.success(message)
+            st.markdown(f"<p class='probability'>Probabilité de désabonnement : <strong>{(result['churn_probability'] * 100):.2f}%</strong></p>", unsafe_allow_html=True)
+            st.success(STABLE_MESSAGE)
+
+        if "latency_ms" in result:
+            st.caption(f"⏱️ Temps de calcul : {result['latency_ms']:.3f} ms ({'cache' if result.get('cached') else 'modèle'}) · {result['total_ms']:.3f} ms (prétraitement + modèle) · seuil de décision {decision_threshold:.2f}")
+            cache_stats = score_cache.stats()
+            st.caption(f"🗄️ Cache des scores : {cache_stats['hits']} succès · {cache_stats['misses']} échecs · {cache_stats['evictions']} évictions · {cache_stats['entries']} en mémoire · {cache_stats['disk_entries']} sur disque")
+
+        # --- Churn Drivers ---
+        # Décomposition exacte du log-odds du modèle, variable par variable (même calcul que la probabilité)
+        if result.get("drivers"):
+            st.markdown("<h4>Principaux Facteurs</h4>", unsafe_allow_html=True)
+            drivers = pd.DataFrame([{
+                "Variable": driver["feature"],
+                "Valeur": SWEEP_LABELS.get(driver["feature"], {}).get(driver["value"], driver["value"]),
+                "Effet (log-odds)": round(driver["contribution"], 3),
+                "Sens": "↑ risque" if driver["contribution"] > 0 else "↓ risque",
+            } for driver in result["drivers"][:TOP_DRIVERS]])
+            st.dataframe(drivers.astype({"Valeur": str}), hide_index=True)
+
+        # --- What-If Analysis ---
+        if "features" in result:
+            st.markdown("<h4>Analyse What-If</h4>", unsafe_allow_html=True)
+            whatif_features = st.multiselect(
+                "Variables à faire varier (une ou deux)", list(SWEEP_DOMAINS), default=["Age"],
+                max_selections=2, key="whatif_features"
+            )
+            if whatif_features:
+                axes, churn_curve = sweep_client(scorer, result["features"], whatif_features)
+                labels = [[SWEEP_LABELS.get(f, {}).get(v, v) for v in axis] for f, axis in zip(whatif_features, axes)]
+                if len(whatif_features) == 1:
+                    feature = whatif_features[0]
+                    curve = pd.DataFrame({feature: labels[0], "P(désabonnement)": churn_curve})
+                    if feature in SWEEP_LABELS:
+                        st.bar_chart(curve, x=feature, y="P(désabonnement)")
+                    else:
+                        st.line_chart(curve, x=feature, y="P(désabonnement)")
+                    above = curve[curve["P(désabonnement)"] >= decision_threshold]
+                    st.caption(f"{len(above)} valeur(s) sur {len(curve)} dépassent le seuil de {decision_threshold:.2f}.")
+                else:
+                    import altair as alt
+                    surface = pd.DataFrame({whatif_features[0]: labels[0], whatif_features[1]: labels[1], "P(désabonnement)": churn_curve})
+                    st.altair_chart(
+                        alt.Chart(surface).mark_rect().encode(
+                            x=alt.X(f"{whatif_features[0]}:O"),
+                            y=alt.Y(f"{whatif_features[1]}:O", sort="descending"),
+                            color=alt.Color("P(désabonnement):Q", scale=alt.Scale(domain=[0, 1])),
+                            tooltip=list(surface.columns)
+                        )
+                    )
 
         st.markdown("<div style='text-align: center; margin-top: 1.5rem;'>", unsafe_allow_html=True)
         if st.button("Nouvelle Prédiction", key="new_prediction_btn"):
             st.session_state.prediction_result = None
             st.session_state.prediction_message = None
-            st.rerun()
+            rerun()
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -304,18 +257,18 @@ if selected == "Prédiction de Désabonnement":
         col1, col2 = st.columns(2)
 
         with col1:
-            credit_score = st.slider("Score de Crédit", 350, 850, 650, key="main_credit_score")
-            geography = st.selectbox("Géographie", ['France', 'Allemagne', 'Espagne'], key="main_geography")
-            gender = st.selectbox("Sexe", ['Homme', 'Femme'], key="main_gender")
-            age = st.number_input("Âge", min_value=18, max_value=92, value=35, key="main_age")
-            tenure = st.number_input("Ancienneté (années)", min_value=0, max_value=10, value=5, key="main_tenure")
+            credit_score = st.slider("Score de Crédit", *ENCODER.bounds("CreditScore"), key="main_credit_score")
+            geography = st.selectbox("Géographie", ENCODER.options("Geography"), key="main_geography")
+            gender = st.selectbox("Sexe", ENCODER.options("Gender"), key="main_gender")
+            age = st.number_input("Âge", *ENCODER.bounds("Age"), key="main_age")
+            tenure = st.number_input("Ancienneté (années)", *ENCODER.bounds("Tenure"), key="main_tenure")
 
         with col2:
-            balance = st.number_input("Solde du Compte (€)", min_value=0.0, value=0.0, step=0.01, key="main_balance")
-            num_products = st.number_input("Nombre de Produits", min_value=1, max_value=4, value=1, key="main_num_products")
-            has_cr_card = st.selectbox("Possède une Carte de Crédit ?", ['Oui', 'Non'], key="main_has_cr_card")
-            is_active_member = st.selectbox("Est un Membre Actif ?", ['Oui', 'Non'], key="main_is_active_member")
-            estimated_salary = st.number_input("Salaire Estimé Annuel (€)", min_value=0.0, value=50000.0, step=0.01, key="main_estimated_salary")
+            balance = st.number_input("Solde du Compte (€)", *ENCODER.bounds("Balance"), step=0.01, key="main_balance")
+            num_products = st.number_input("Nombre de Produits", *ENCODER.bounds("NumOfProducts"), key="main_num_products")
+            has_cr_card = st.selectbox("Possède une Carte de Crédit ?", ENCODER.options("HasCrCard"), key="main_has_cr_card")
+            is_active_member = st.selectbox("Est un Membre Actif ?", ENCODER.options("IsActiveMember"), key="main_is_active_member")
+            estimated_salary = st.number_input("Salaire Estimé Annuel (€)", *ENCODER.bounds("EstimatedSalary"), step=0.01, key="main_estimated_salary")
 
         st.markdown("<div style='text-align: center; margin-top: 2rem;'>", unsafe_allow_html=True)
         submitted = st.form_submit_button("Prédire le Désabonnement", type="primary")
@@ -323,38 +276,90 @@ if selected == "Prédiction de Désabonnement":
 
     if submitted:
         with st.spinner("Analyse en cours..."):
-            time.sleep(2) # Simule un délai de traitement
-
-            input_data = preprocess_input(
+            start = time.perf_counter()
+            features = preprocess_input(
                 credit_score, geography, gender, age, tenure, balance,
                 num_products, has_cr_card, is_active_member, estimated_salary
             )
 
-            if input_data is not None:
-                prediction = model.predict(input_data)[0]
-                prediction_proba = model.predict_proba(input_data)[0]
-
-                st.session_state.prediction_result = {
-                    "prediction": int(prediction),
-                    "probability": float(prediction_proba[1]) if prediction == 1 else float(prediction_proba[0])
-                }
-                if prediction == 1:
-                    st.session_state.prediction_message = "Action Requise : Ce client présente un risque significatif de désabonnement. Une intervention rapide (offre personnalisée, contact proactif) est cruciale pour la rétention."
-                else:
-                    st.session_state.prediction_message = "Bonne nouvelle : Ce client est stable. Continuez à maintenir une relation positive pour assurer sa satisfaction et sa fidélité."
+            if features is not None:
+                # Probabilité et facteurs issus du même passage du modèle
+                result = predict_client(scorer, features, decision_threshold, cache=score_cache, explain=TOP_DRIVERS)
+                result["total_ms"] = (time.perf_counter() - start) * 1000
+                result["features"] = features[0].tolist()
+                st.session_state.prediction_result = result
+                st.session_state.prediction_message = CHURN_MESSAGE if result["prediction"] == 1 else STABLE_MESSAGE
             else:
                 st.session_state.prediction_result = {"error": True}
                 st.session_state.prediction_message = "Impossible de traiter les données. Vérifiez les entrées."
-        st.rerun()
+        rerun()
+
+    # --- Bulk Scoring (CSV/Parquet) ---
+    st.markdown("<h4>Scoring par Lot</h4>", unsafe_allow_html=True)
+    st.markdown("<p style='color: var(--secondary-color);'>Téléversez un fichier CSV ou Parquet contenant les colonnes du modèle pour scorer toute une base clients.</p>", unsafe_allow_html=True)
+    with st.form("batch_scoring_form", clear_on_submit=False):
+        batch_file = st.file_uploader("📂 Fichier clients (csv, parquet)", type=["csv", "parquet"], key="batch_input_file")
+        batch_col1, batch_col2 = st.columns(2)
+        with batch_col1:
+            batch_output_format = st.selectbox("Format de sortie", ['csv', 'parquet'], key="batch_output_format")
+        with batch_col2:
+            batch_chunk_size = st.number_input("Lignes par bloc", min_value=1000, max_value=1_000_000, value=DEFAULT_CHUNK_SIZE, step=1000, key="batch_chunk_size")
+        batch_explain = st.checkbox("Ajouter les 3 principaux facteurs de chaque client", key="batch_explain")
+        batch_submitted = st.form_submit_button("Lancer le Scoring", type="primary")
+
+    if batch_submitted:
+        if batch_file is None:
+            st.warning("Veuillez téléverser un fichier avant de lancer le scoring.")
+        else:
+            previous_output = st.session_state.get("batch_output_path")
+            if previous_output and os.path.exists(previous_output):
+                os.remove(previous_output)
+            st.session_state.batch_output_path = None
+
+            progress_text = st.empty()
+            output_path = tempfile.NamedTemporaryFile(delete=False, suffix=f".{batch_output_format}").name
+            try:
+                start = time.perf_counter()
+                rows = score_file(
+                    scorer, batch_file, output_path,
+                    input_format=detect_format(batch_file.name),
+                    output_format=batch_output_format,
+                    chunk_size=int(batch_chunk_size),
+                    explain=3 if batch_explain else 0,
+                    on_progress=lambda done: progress_text.info(f"{done} clients scorés...")
+                )
+                st.session_state.batch_output_path = output_path
+                st.session_state.batch_output_name = f"{os.path.splitext(batch_file.name)[0]}_scores.{batch_output_format}"
+                progress_text.success(f"{rows} clients scorés en {time.perf_counter() - start:.2f} s.")
+            except Exception as e:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                progress_text.error(f"Erreur Scoring par Lot: {e}")
+
+    batch_output_path = st.session_state.get("batch_output_path")
+    if batch_output_path and os.path.exists(batch_output_path):
+        with open(batch_output_path, "rb") as batch_output_file:
+            st.download_button("⬇️ Télécharger les résultats", batch_output_file,
+                               file_name=st.session_state.get("batch_output_name", os.path.basename(batch_output_path)),
+                               key="batch_download_btn")
 
     st.markdown("</div>", unsafe_allow_html=True) # Clôture hypothétique d'un div parent pour la section prédiction
 
 elif selected == "Chatbot d'Assistance":
+    from llm_client import CHAT_MODEL, chat_reply, client_settings, get_client, reset_client
+    from transcription import AudioRejected, decode_recorded_audio, new_transcription_cache, payload_digest, transcribe
+    from chat_history import AudioBlobStore, ChatHistory, ChatMessage, CHAT_VISIBLE_MESSAGES
+    from chat_context import ConversationContext, llm_summarizer
+    from chat_tools import CHAT_TOOLS_ENABLED, ChurnTools
+    from jobs import JOB_POLL_SECONDS, JobQueueFull, get_runner
+    from recorder import COMPONENT_NAME, audio_recorder_component
+    run_timer.mark("chatbot_imports")
+
     # load_dotenv() # Retiré
     client = None # Initialisation
     try:
-        # Modification pour utiliser st.secrets
-        client = Groq(api_key=st.secrets["GROQ_API_KEY"])
+        # Client partagé par le processus : reconstruit seulement si la clé ou les réglages changent
+        client = get_client(st.secrets["GROQ_API_KEY"], client_settings(st.secrets))
     except KeyError: # Spécifiquement pour une clé manquante dans st.secrets
         st.error("Erreur d'API Groq: La clé 'GROQ_API_KEY' n'est pas configurée dans les secrets de Streamlit.")
         st.stop()
@@ -362,40 +367,175 @@ elif selected == "Chatbot d'Assistance":
         st.error(f"Erreur d'initialisation Groq: Impossible de se connecter à l'API Groq. Erreur: {e}. Vérifiez votre clé et votre connexion.")
         st.stop()
 
+    # Cache des transcriptions partagé par toutes les sessions (clé : empreinte de l'audio + paramètres)
+    @st.cache_resource
+    def load_transcription_cache():
+        return new_transcription_cache()
+
+    transcription_cache = load_transcription_cache()
+
+    # Enregistrements décodés une seule fois, partagés par les sessions ; l'historique ne garde que leur identifiant
+    @st.cache_resource
+    def load_audio_store():
+        return AudioBlobStore()
+
+    audio_store = load_audio_store()
+    # Transcriptions et réponses tournent dans un pool borné partagé par le processus
+    job_runner = get_runner()
+    CHAT_GREETING = "Bonjour ! Je suis votre assistant virtuel. Comment puis-je vous aider aujourd'hui ?"
+
     # Le reste de votre code pour le Chatbot d'Assistance reste identique
     st.markdown("<h3><svg viewBox='0 0 24 24' width='30' height='30' fill='none' stroke='currentColor' stroke-width='2' stroke-linecap='round' stroke-linejoin='round'><path d='M21 15a2 2 0 0 1-2 2H7l-4 4V3a2 2 0 0 1 2-2h14a2 2 0 0 1 2 2z'></path></svg>Assistant Virtuel</h3>", unsafe_allow_html=True)
 
     st.sidebar.title("⚙️ Paramètres du Chatbot")
     if st.sidebar.button("Effacer l'historique du Chatbot"):
-        st.session_state.messages = []
-        st.session_state.messages.append({"role": "bot", "content": "Bonjour ! Je suis votre assistant virtuel. Comment puis-je vous aider aujourd'hui ?"})
-        if 'last_processed_recorded_audio' in st.session_state: # Aussi effacer ce cache
-            del st.session_state['last_processed_recorded_audio']
-        st.rerun()
-
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-        st.session_state.messages.append({"role": "bot", "content": "Bonjour ! Je suis votre assistant virtuel. Comment puis-je vous aider aujourd'hui ?"})
-
-    # --- Display chat history with icons ---
-    for message_item in st.session_state.messages:
-        if message_item["role"] == "user":
-            st.markdown(f"""
-                <div class='message-bubble user-message'>
-                    <span class='message-icon'>👤</span> {message_item['content']}
+        if st.session_state.get("chat_job") is not None:
+            st.session_state.chat_job.cancel() # La réponse en cours est abandonnée
+            st.session_state.chat_job = None
+        st.session_state.messages = ChatHistory(greeting=CHAT_GREETING)
+        st.session_state.chat_context = ConversationContext()
+        st.session_state.pop('playing_audio_id', None)
+        if 'last_processed_recorded_audio_hash' in st.session_state: # Aussi effacer ce cache
+            del st.session_state['last_processed_recorded_audio_hash']
+        rerun()
+    transcription_stats = transcription_cache.stats()
+    st.sidebar.caption(f"🎙️ Cache des transcriptions : {transcription_stats['hits']} succès · {transcription_stats['misses']} échecs · {transcription_stats['entries']} entrées ({transcription_stats['bytes'] / 1024:.1f} Ko)")
+
+    if not isinstance(st.session_state.get("messages"), ChatHistory):
+        st.session_state.messages = ChatHistory(greeting=CHAT_GREETING)
+        st.session_state.chat_context = ConversationContext()
+    history = st.session_state.messages
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = ConversationContext()
+    chat_context = st.session_state.chat_context
+    audio_stats = audio_store.stats()
+    st.sidebar.caption(f"💾 Historique de session : {len(history)} messages ({history.memory_bytes() / 1024:.1f} Ko)"
+                       f"{f' · {history.dropped} anciens messages supprimés' if history.dropped else ''}"
+                       f" · Audio partagé : {audio_stats['entries']} clips ({audio_stats['bytes'] / 1024:.1f} Ko)")
+    job_stats = job_runner.stats()
+    st.sidebar.caption(f"🧵 Tâches : {job_stats['running']} en cours sur {job_stats['workers']} · {job_stats['done']} terminées"
+                       f" · {job_stats['failed']} en échec · {job_stats['cancelled']} annulées · {job_stats['rejected']} refusées")
+    st.sidebar.caption(f"🧠 Contexte envoyé : ~{chat_context.last_prompt_tokens} tokens sur {chat_context.budget_tokens}"
+                       f" · Résumé mis à jour {chat_context.summary_updates} fois")
+
+    def render_bubble(role, content):
+        css_class, icon = ("user-message", "👤") if role == "user" else ("bot-message", "🤖")
+        return f"""
+                <div class='message-bubble {css_class}'>
+                    <span class='message-icon'>{icon}</span> {content}
                 </div>
-            """, unsafe_allow_html=True)
-            if 'audio_data' in message_item and message_item['audio_data']: 
-                try:
-                    st.audio(base64.b64decode(message_item['audio_data']), format='audio/webm', start_time=0)
-                except Exception as e:
-                    st.warning(f"Impossible de lire l'audio enregistré : {e}")
+            """
+
+    def chat_job(job, churn_tools, user_text=None, audio=None, filename=None):
+        """
+        Background part of a chat turn, run by the job pool (no Streamlit calls here):
+        transcribe the audio if needed, then stream the answer into the job handle.
+        """
+        if user_text is None:
+            job.update("Transcription audio en cours…")
+            user_text = transcribe(client, audio, filename, cache=transcription_cache)
+            if not user_text:
+                raise AudioRejected("Aucune transcription obtenue, le chatbot ne sera pas interrogé.")
+        job.user_text = user_text
+        job.update("Réponse en cours…")
+        messages = chat_context.build(history, summarize=llm_summarizer(client, CHAT_MODEL),
+                                      extra=[ChatMessage("user", user_text, job.meta.get("audio_id"), None)])
+        text, timing = chat_reply(
+            client, messages, on_text=job.stream_text,
+            tools=churn_tools.definitions if CHAT_TOOLS_ENABLED else None, run_tool=churn_tools
+        )
+        timing['queue_ms'] = job.queue_ms
+        return {"text": text, "timing": timing}
+
+    def submit_chat_job(audio_id=None, **request):
+        """Queue a chat turn for this session; returns False if it could not be queued."""
+        if st.session_state.get("chat_job") is not None:
+            st.session_state.chat_error = "Une réponse est déjà en cours, veuillez patienter."
+            return False
+        # Outil de scoring : le modèle local évalue en un seul appel les clients décrits dans la question
+        churn_tools = ChurnTools(scorer, cache=score_cache,
+                                 threshold=st.session_state.get("decision_threshold", DEFAULT_THRESHOLD))
+        try:
+            st.session_state.chat_job = job_runner.submit(lambda job: chat_job(job, churn_tools, **request),
+                                                          audio_id=audio_id)
+        except JobQueueFull as e:
+            st.session_state.chat_error = str(e)
+            return False
+        return True
+
+    def finish_chat_job(job):
+        """Store the turn of a finished job in the history (script thread only)."""
+        st.session_state.chat_job = None
+        if job.cancelled:
+            return
+        if job.error is not None:
+            if getattr(job.error, "status_code", None) == 401:
+                reset_client() # Clé révoquée ou changée : reconstruire le client au prochain tour
+            if job.user_text is None:
+                st.session_state.chat_error = f"Erreur Transcription : {job.error}"
+                return
+            st.session_state.chat_error = f"Erreur Chatbot (API): Impossible d'obtenir une réponse du chatbot Groq. Erreur: {job.error}"
+            history.append("user", job.user_text, audio_id=job.meta.get("audio_id"))
+            history.append("bot", "Désolé, je n'ai pas pu traiter votre demande. Une erreur est survenue lors de la communication avec le service de chatbot.")
+            return
+        history.append("user", job.user_text, audio_id=job.meta.get("audio_id"))
+        history.append("bot", job.result["text"], timing=job.result["timing"])
+
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def pending_answer():
+        """Poll the session's job; only this fragment re-runs until the answer is complete."""
+        job = st.session_state.get("chat_job")
+        if job is None or job.done:
+            rerun()
+        if job.user_text:
+            st.markdown(render_bubble("user", job.user_text), unsafe_allow_html=True)
+        if job.partial:
+            st.markdown(render_bubble("bot", job.partial + " ▌"), unsafe_allow_html=True)
         else:
-            st.markdown(f"""
-                <div class='message-bubble bot-message'>
-                    <span class='message-icon'>🤖</span> {message_item['content']}
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(render_bubble("bot", f"⏳ {job.status}"), unsafe_allow_html=True)
+
+    def render_message(index, message_item):
+        st.markdown(render_bubble(message_item.role, message_item.content), unsafe_allow_html=True)
+        if message_item.audio_id:
+            # Lecteur créé à la demande : les clips ne sont envoyés au navigateur que s'ils sont écoutés
+            if st.session_state.get('playing_audio_id') == message_item.audio_id:
+                audio_bytes = audio_store.get(message_item.audio_id)
+                if audio_bytes is None:
+                    st.caption("🔇 Enregistrement expiré du cache audio.")
+                else:
+                    st.audio(audio_bytes, format='audio/webm', start_time=0)
+            elif st.button("▶️ Écouter l'enregistrement", key=f"play_audio_{index}"):
+                st.session_state['playing_audio_id'] = message_item.audio_id
+                rerun()
+        if message_item.timing:
+            timing = message_item.timing
+            timing_caption = f"⏱️ Premier token : {timing['ttft_ms']:.0f} ms · Réponse complète : {timing['total_ms']:.0f} ms{'' if timing['streamed'] else ' (sans streaming)'}"
+            if timing.get('tool_calls'):
+                timing_caption += f" · {timing['tool_calls']} appel(s) au modèle de churn ({timing['tool_ms']:.1f} ms)"
+            st.caption(timing_caption)
+
+    # Une réponse terminée depuis le dernier passage est d'abord rangée dans l'historique
+    finished_job = st.session_state.get("chat_job")
+    if finished_job is not None and finished_job.done:
+        finish_chat_job(finished_job)
+    if st.session_state.get("chat_error"):
+        st.error(st.session_state.pop("chat_error"))
+
+    # --- Display chat history with icons ---
+    older_messages, recent_messages = history.split(CHAT_VISIBLE_MESSAGES)
+    if older_messages:
+        # Les anciens tours sont repliés et paginés : rien n'est rendu tant qu'ils ne sont pas demandés
+        if st.checkbox(f"Afficher les {len(older_messages)} messages précédents", key="show_older_messages"):
+            page_count = -(-len(older_messages) // CHAT_VISIBLE_MESSAGES)
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=page_count, key="older_messages_page")
+            start = (int(page) - 1) * CHAT_VISIBLE_MESSAGES
+            for index, message_item in enumerate(older_messages[start:start + CHAT_VISIBLE_MESSAGES], start):
+                render_message(index, message_item)
+            st.markdown("---")
+    for index, message_item in enumerate(recent_messages, len(older_messages)):
+        render_message(index, message_item)
+    if st.session_state.get("chat_job") is not None:
+        pending_answer()
 
     st.markdown("<div style='margin-top: 1.5rem;'></div>", unsafe_allow_html=True)
 
@@ -407,139 +547,32 @@ elif selected == "Chatbot d'Assistance":
         audio_file_uploader = st.file_uploader("📢 Téléversez un message audio (format m4a, mp3, wav)", type=["m4a", "mp3", "wav"], key="chat_audio_uploader")
         send_button = st.form_submit_button("✉️ Envoyer Message", type="primary")
 
-    processed_message_content = ""
-    audio_to_display = None 
-
-    component_name = "audio_recorder_custom_component" 
-
-    if recorded_audio_base64 and recorded_audio_base64 != st.session_state.get('last_processed_recorded_audio', None):
-        st.info("DEBUG (Python): Détection d'un nouvel audio enregistré. Traitement en cours...")
-        st.session_state['last_processed_recorded_audio'] = recorded_audio_base64 
-
+    # Seule l'empreinte du dernier enregistrement traité est gardée en session, pas le base64 complet
+    recorded_audio_hash = payload_digest(recorded_audio_base64) if recorded_audio_base64 else None
+    if recorded_audio_hash and recorded_audio_hash != st.session_state.get('last_processed_recorded_audio_hash', None):
+        logger.debug("Nouvel audio enregistré détecté", extra={'fields': {'audio_hash': recorded_audio_hash[:12]}})
+        st.session_state['last_processed_recorded_audio_hash'] = recorded_audio_hash
         try:
-            st.info(f"DEBUG (Python): Base64 audio reçu. Longueur : {len(recorded_audio_base64) if recorded_audio_base64 else 0}")
-            
-            audio_bytes = base64.b64decode(recorded_audio_base64)
-            audio_to_display = recorded_audio_base64 
-
-            st.info(f"DEBUG (Python): Audio décodé en octets. Longueur : {len(audio_bytes)}")
-
-            if not audio_bytes:
-                st.error("Erreur Enregistrement: L'audio enregistré est vide après décodage Base64.")
-                if component_name in st.session_state:
-                    del st.session_state[component_name]
-                st.rerun() 
-            
-            temp_audio_path = "" # Initialisation pour éviter UnboundLocalError
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio_file:
-                temp_audio_file.write(audio_bytes)
-            temp_audio_path = temp_audio_file.name
-
-            st.info(f"DEBUG (Python): Fichier temporaire créé à : {temp_audio_path}")
-            if not os.path.exists(temp_audio_path) or os.path.getsize(temp_audio_path) == 0:
-                st.error(f"Erreur Enregistrement: Le fichier audio temporaire est vide ou n'a pas été créé correctement à {temp_audio_path}.")
-                if os.path.exists(temp_audio_path): 
-                    os.remove(temp_audio_path)
-                if component_name in st.session_state:
-                    del st.session_state[component_name]
-                st.rerun()
-
-            with open(temp_audio_path, "rb") as file:
-                with st.spinner("Transcription audio en cours..."):
-                    try: 
-                        transcription = client.audio.transcriptions.create(
-                            file=("recorded_audio.webm", file.read()), 
-                            model="whisper-large-v3",
-                            response_format="json",
-                            language="fr",
-                            temperature=0.0
-                        )
-                        processed_message_content = transcription.text
-                        st.info(f"DEBUG (Python): Transcription réussie: '{processed_message_content}'")
-                    except Exception as groq_transcription_error:
-                        st.error(f"Erreur Transcription (Groq API) : {groq_transcription_error}")
-                        processed_message_content = "" 
-
-            if os.path.exists(temp_audio_path): 
-                os.remove(temp_audio_path) 
-
-            if processed_message_content:
-                st.session_state.messages.append({"role": "user", "content": processed_message_content, "audio_data": audio_to_display})
-                with st.spinner("Le chatbot réfléchit..."):
-                    try:
-                        chat_completion = client.chat.completions.create(
-                            messages=[{"role": "user", "content": processed_message_content}],
-                            model="llama3-70b-8192", # Modèle exemple, ajustez si besoin
-                        )
-                        response_text = chat_completion.choices[0].message.content
-                        st.session_state.messages.append({"role": "bot", "content": response_text})
-                        st.info(f"DEBUG (Python): Réponse du chatbot obtenue.")
-                    except Exception as e_chat: # Renommé pour éviter conflit avec e extérieur
-                        st.error(f"Erreur Chatbot (API): Impossible d'obtenir une réponse du chatbot Groq. Erreur: {e_chat}")
-                        st.session_state.messages.append({"role": "bot", "content": "Désolé, je n'ai pas pu traiter votre demande. Une erreur est survenue lors de la communication avec le service de chatbot."})
-            else:
-                st.warning("Aucune transcription obtenue, le chatbot ne sera pas interrogé.")
-
-            if component_name in st.session_state:
-                del st.session_state[component_name]
-            st.rerun()
-
-        except Exception as e_outer: # Renommé pour éviter conflit
-            st.error(f"Erreur Générale (Audio Enregistré): Une erreur inattendue est survenue lors du traitement de l'audio enregistré. Erreur: {e_outer}")
-            if component_name in st.session_state:
-                del st.session_state[component_name]
-            if 'last_processed_recorded_audio' in st.session_state:
-                del st.session_state['last_processed_recorded_audio']
-            st.rerun() 
+            audio_bytes = decode_recorded_audio(recorded_audio_base64)
+            # Transcription et réponse en tâche de fond : la page reste réactive pendant le traitement
+            submit_chat_job(audio=audio_bytes, filename="recorded_audio.webm", audio_id=audio_store.put(audio_bytes))
+        except AudioRejected as e_audio:
+            st.session_state.chat_error = f"Erreur Enregistrement: {e_audio}"
+        if COMPONENT_NAME in st.session_state:
+            del st.session_state[COMPONENT_NAME]
+        rerun()
 
     elif send_button:
-        user_input_for_chatbot = "" # Pour stocker le texte à envoyer au chatbot
         if audio_file_uploader:
-            st.info("Traitement du fichier audio téléversé...")
-            try:
-                original_filename = audio_file_uploader.name
-                temp_file_path_upload = tempfile.NamedTemporaryFile(delete=False, suffix=f".{original_filename.split('.')[-1]}").name
-                with open(temp_file_path_upload, "wb") as f:
-                    f.write(audio_file_uploader.getvalue())
-
-                with open(temp_file_path_upload, "rb") as file_to_transcribe:
-                    with st.spinner("Transcription audio (téléversé) en cours..."):
-                        transcription = client.audio.transcriptions.create(
-                            file=(original_filename, file_to_transcribe.read()),
-                            model="whisper-large-v3",
-                            response_format="json",
-                            language="fr",
-                            temperature=0.0
-                        )
-                user_input_for_chatbot = transcription.text
-                # Pas besoin d'ajouter audio_data ici car c'est un fichier uploadé, pas un enregistrement direct pour relecture simple
-                st.session_state.messages.append({"role": "user", "content": user_input_for_chatbot}) 
-                os.remove(temp_file_path_upload) 
-            except Exception as e_upload_form: # Renommé
-                st.error(f"Erreur Transcription (Fichier Téléversé): {e_upload_form}")
-                user_input_for_chatbot = ""
+            # Le fichier téléversé est déjà en mémoire : il est transmis tel quel, sans copie sur disque.
+            # Pas d'identifiant audio ici : c'est un fichier téléversé, pas un enregistrement à relire
+            submit_chat_job(audio=audio_file_uploader, filename=audio_file_uploader.name)
         elif message_input:
-            user_input_for_chatbot = message_input
-            st.session_state.messages.append({"role": "user", "content": user_input_for_chatbot})
-
-        if user_input_for_chatbot: # S'il y a eu du contenu (texte ou transcription d'upload)
-            st.info("DEBUG (Python): Message (formulaire) envoyé au Chatbot.") # Message de debug plus clair
-            with st.spinner("Le chatbot réfléchit..."):
-                try:
-                    chat_completion = client.chat.completions.create(
-                        messages=[{"role": "user", "content": user_input_for_chatbot}],
-                        model="llama3-70b-8192", # Modèle exemple
-                    )
-                    response_text = chat_completion.choices[0].message.content
-                    st.session_state.messages.append({"role": "bot", "content": response_text})
-                except Exception as e_chat_form: # Renommé
-                    st.error(f"Erreur Chatbot (API Formulaire): {e_chat_form}")
-                    st.session_state.messages.append({"role": "bot", "content": "Désolé, je n'ai pas pu traiter votre demande (formulaire)."})
-        
-        if 'last_processed_recorded_audio' in st.session_state:
-            del st.session_state['last_processed_recorded_audio']
-        
-        st.rerun() 
+            submit_chat_job(user_text=message_input)
+
+        if 'last_processed_recorded_audio_hash' in st.session_state:
+            del st.session_state['last_processed_recorded_audio_hash']
+        rerun()
 
     st.markdown("</div>", unsafe_allow_html=True) # Fermeture hypothétique du div.content-card
 
@@ -551,3 +584,61 @@ st.markdown("""
         Optimisé pour une interaction intuitive.
     </p>
     """, unsafe_allow_html=True)
+
+# --- Rerun Timing Report ---
+# Affiché avec RERUN_TIMING=1 ou ?timing=1 : coût de ce passage par phase, comparé au démarrage à froid
+run_timer.mark("page")
+rerun_report = run_timer.finish()
+if RERUN_TIMING_ENABLED or st.query_params.get("timing") == "1":
+    with st.sidebar.expander("⏱️ Coût du passage du script"):
+        run_label = "Démarrage à froid" if rerun_report['cold'] else f"Passage n°{rerun_report['run']}"
+        st.caption(f"{run_label} : {rerun_report['total_ms']:.1f} ms")
+        st.dataframe(pd.DataFrame(rerun_report['phases'], columns=["Phase", "ms"]).round(2), hide_index=True)
+        rerun_stats = rerun_summary()
+        if rerun_stats['cold'] is not None:
+            st.caption(f"Démarrage à froid du processus : {rerun_stats['cold']['total_ms']:.1f} ms")
+        if rerun_stats['warm_runs']:
+            st.caption(f"Moyenne sur {rerun_stats['warm_runs']} passages à chaud : {rerun_stats['warm_total_ms']:.1f} ms")
+
+# --- Telemetry Export & Admin Panel ---
+# Export périodique (TELEMETRY_PROM_FILE / TELEMETRY_JSON_LOG) et, pour les opérateurs munis
+# du jeton ADMIN_TOKEN (secrets ou environnement) passé en ?admin=..., les percentiles en direct.
+TELEMETRY_PANEL_REFRESH_SECONDS = float(os.environ.get('TELEMETRY_PANEL_REFRESH_SECONDS', '5'))
+telemetry.export_files()
+
+def get_admin_token():
+    try:
+        return st.secrets.get("ADMIN_TOKEN") or os.environ.get("ADMIN_TOKEN", "")
+    except FileNotFoundError: # Pas de fichier de secrets
+        return os.environ.get("ADMIN_TOKEN", "")
+
+def is_admin():
+    token = get_admin_token()
+    supplied = st.query_params.get("admin", "")
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+@st.fragment(run_every=TELEMETRY_PANEL_REFRESH_SECONDS)
+def telemetry_panel():
+    """Live percentiles of this server process; only this fragment re-runs on refresh."""
+    stats = telemetry.snapshot()
+    st.caption(f"Processus {stats['pid']} — actif depuis {stats['uptime_s'] / 60:.0f} min — modèle {MODEL_PATH}")
+    if stats['timers']:
+        timers = pd.DataFrame([
+            {"Mesure": t['name'], "Étiquettes": ", ".join(f"{k}={v}" for k, v in sorted(t['labels'].items())),
+             "N": t['count'], "p50 ms": t['p50_ms'], "p95 ms": t['p95_ms'], "p99 ms": t['p99_ms']}
+            for t in stats['timers']
+        ])
+        st.dataframe(timers.round(2), hide_index=True)
+    if stats['counters']:
+        counters = pd.DataFrame([
+            {"Compteur": c['name'], "Étiquettes": ", ".join(f"{k}={v}" for k, v in sorted(c['labels'].items())),
+             "Valeur": c['value']}
+            for c in stats['counters']
+        ])
+        st.dataframe(counters, hide_index=True)
+    st.download_button("Exporter (Prometheus)", telemetry.render_prometheus(), file_name="clientinsight.prom",
+                       mime="text/plain", key="telemetry_prom_download")
+
+if is_admin():
+    with st.sidebar.expander("📊 Télémétrie (administrateur)", expanded=True):
+        telemetry_panel()
@@ -0,0 +1,222 @@
+"""
+Versioned model artifact for the churn classifier.
+
+The GaussianNB parameters are written to an uncompressed .npz file together with a
+JSON header (format name, schema version, sklearn version used for export, feature
+layout and preprocessing constants) and a SHA-256 checksum of the arrays. Loading it
+needs NumPy only: no unpickling and no sklearn import.
+
+    python artifact.py export model.pkl model.npz
+    python artifact.py inspect model.npz
+
+Retrained models (see train.py) are published as numbered artifacts in MODEL_DIR with
+a CURRENT pointer file naming the active one; swapping or rolling back a model is a
+single atomic rename of that pointer.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+import telemetry
+from scoring import ENCODER, FEATURE_COLUMNS, CompiledGaussianNB, compile_model, load_model_file
+
+ARTIFACT_FORMAT = 'clientinsight-gaussiannb'
+ARTIFACT_VERSION = 1
+ARRAY_NAMES = ('theta', 'var', 'class_prior', 'classes', 'epsilon')
+
+
+class ArtifactError(ValueError):
+    """Raised when an artifact is unreadable, corrupted or from an unsupported version."""
+
+
+def arrays_checksum(arrays):
+    """SHA-256 over the named arrays in a fixed order, including dtype and shape."""
+    digest = hashlib.sha256()
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def encoding_tables(spec):
+    """
+    The parts of an encoder spec that decide the encoded values: column order and type,
+    category codes and aliases. Numeric bounds only validate input and are left out.
+    """
+    return [{key: column.get(key) for key in ('name', 'type', 'categories', 'aliases')}
+            for column in spec.get('columns', [])]
+
+
+# --- Export ---
+def export_artifact(model, path, training=None):
+    """
+    Write a fitted sklearn GaussianNB to `path` as a versioned .npz artifact.
+    The class counts are kept in the header so training can resume from the artifact;
+    `training` (JSON-serialisable) records how the model was produced.
+    """
+    import sklearn
+
+    arrays = {
+        'theta': np.asarray(model.theta_, dtype=np.float64),
+        'var': np.asarray(model.var_, dtype=np.float64),
+        'class_prior': np.asarray(model.class_prior_, dtype=np.float64),
+        'classes': np.asarray(model.classes_, dtype=np.int64),
+        'epsilon': np.asarray([model.epsilon_], dtype=np.float64),
+    }
+    header = {
+        'format': ARTIFACT_FORMAT,
+        'version': ARTIFACT_VERSION,
+        'sklearn_version': sklearn.__version__,
+        'feature_columns': FEATURE_COLUMNS,
+        'preprocessing': {'encoder_spec': ENCODER.spec},
+        'checksum': arrays_checksum(arrays),
+        'class_count': np.asarray(model.class_count_, dtype=np.float64).tolist(),
+        'var_smoothing': model.var_smoothing,
+    }
+    if training is not None:
+        header['training'] = training
+    # Write next to the target then rename, so readers never see a partial file.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, header=np.array(json.dumps(header)), **arrays)
+    os.replace(tmp_path, path)
+    return header
+
+
+# --- Import ---
+def read_artifact(path):
+    """Return (header, arrays) after validating format, version, encoding tables and checksum."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            arrays = {name: data[name] for name in ARRAY_NAMES}
+    except (OSError, KeyError, ValueError) as e:
+        raise ArtifactError(f"Artefact illisible '{path}' : {e}") from e
+
+    if header.get('format') != ARTIFACT_FORMAT:
+        raise ArtifactError(f"Format d'artefact inattendu : {header.get('format')!r}")
+    if header.get('version') != ARTIFACT_VERSION:
+        raise ArtifactError(f"Version d'artefact non supportée : {header.get('version')!r} (attendue : {ARTIFACT_VERSION})")
+    if header.get('feature_columns') != FEATURE_COLUMNS:
+        raise ArtifactError("Les colonnes de l'artefact ne correspondent pas à celles de l'application.")
+    embedded_spec = header.get('preprocessing', {}).get('encoder_spec', {})
+    if encoding_tables(embedded_spec) != encoding_tables(ENCODER.spec):
+        raise ArtifactError(f"L'encodage enregistré dans '{path}' (catégories, alias) ne correspond pas à "
+                            "encoder_spec.json : réexportez ou réentraînez le modèle avec la spécification actuelle.")
+    if arrays_checksum(arrays) != header.get('checksum'):
+        raise ArtifactError(f"Somme de contrôle invalide pour '{path}' : fichier corrompu.")
+    return header, arrays
+
+
+def load_artifact(path):
+    """Build the NumPy scorer straight from an artifact file."""
+    _, arrays = read_artifact(path)
+    return CompiledGaussianNB(arrays['theta'], arrays['var'], arrays['class_prior'], arrays['classes'])
+
+
+# --- Versioned Model Store ---
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+POINTER_FILE = 'CURRENT'
+_VERSION_PATTERN = re.compile(r'^model-v(\d+)\.npz$')
+
+
+def version_path(version, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"model-v{version:04d}.npz")
+
+
+def list_versions(model_dir=MODEL_DIR):
+    """Published version numbers in `model_dir`, oldest first."""
+    try:
+        names = os.listdir(model_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(_VERSION_PATTERN.match, names) if match)
+
+
+def read_pointer(model_dir=MODEL_DIR):
+    """Path of the artifact named by the CURRENT pointer, or None when there is no pointer."""
+    try:
+        with open(os.path.join(model_dir, POINTER_FILE), encoding='utf-8') as file:
+            name = file.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(model_dir, name) if name else None
+
+
+def path_version(path):
+    """Version number of a published artifact path, None for any other model file."""
+    match = _VERSION_PATTERN.match(os.path.basename(str(path)))
+    return int(match.group(1)) if match else None
+
+
+def current_version(model_dir=MODEL_DIR):
+    path = read_pointer(model_dir)
+    return path_version(path) if path else None
+
+
+def activate_version(version, model_dir=MODEL_DIR):
+    """Point CURRENT at a published version, after checking that it loads; used for rollbacks too."""
+    path = version_path(version, model_dir)
+    read_artifact(path)
+    tmp_path = os.path.join(model_dir, f"{POINTER_FILE}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(os.path.basename(path) + "\n")
+    os.replace(tmp_path, os.path.join(model_dir, POINTER_FILE))
+    return path
+
+
+def publish_artifact(model, model_dir=MODEL_DIR, training=None, activate=True):
+    """Write `model` as the next numbered artifact of `model_dir` and, by default, make it current."""
+    os.makedirs(model_dir, exist_ok=True)
+    version = (list_versions(model_dir) or [0])[-1] + 1
+    path = version_path(version, model_dir)
+    export_artifact(model, path, training=dict(training or {}, version=version))
+    if activate:
+        activate_version(version, model_dir)
+    return version, path
+
+
+def default_model_path():
+    """
+    MODEL_ARTIFACT if set, else the artifact named by MODEL_DIR/CURRENT, else model.npz
+    when present, else the legacy model.pkl. Cheap enough to call on every request.
+    """
+    return (os.environ.get('MODEL_ARTIFACT') or read_pointer()
+            or ('model.npz' if os.path.exists('model.npz') else 'model.pkl'))
+
+
+def load_scorer(path):
+    """Load a scorer from a .npz artifact, or from a legacy pickle as a fallback."""
+    with telemetry.timed('model_load_seconds'):
+        if str(path).endswith('.npz'):
+            return load_artifact(path)
+        return compile_model(load_model_file(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export et inspection de l'artefact du modèle.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Convertir un modèle pickle en artefact .npz")
+    export.add_argument('source', nargs='?', default='model.pkl')
+    export.add_argument('destination', nargs='?', default='model.npz')
+    inspect = commands.add_parser('inspect', help="Afficher l'en-tête d'un artefact et vérifier sa somme de contrôle")
+    inspect.add_argument('path', nargs='?', default='model.npz')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        header = export_artifact(load_model_file(args.source), args.destination)
+        print(f"Artefact écrit : {args.destination} (sha256 {header['checksum'][:12]})")
+    else:
+        header, _ = read_artifact(args.path)
+        print(json.dumps(header, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
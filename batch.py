@@ -0,0 +1,344 @@
+"""
+Headless bulk churn scoring.
+
+Reads a CSV or Parquet file in fixed-size chunks, scores each chunk with a single
+vectorized scorer call and streams the results to the output file, so memory stays
+bounded by the chunk size rather than the input size.
+
+    python batch.py clients.csv scores.csv --chunk-size 50000
+    python batch.py clients.csv scores.csv --explain 3
+    python batch.py clients.csv scores.csv --workers 8
+
+With --workers, the input is split into shards (line-aligned byte ranges of a CSV, row
+groups of a Parquet file) that a process pool parses, encodes and scores in parallel;
+the scored shards are appended to the output in input order.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import telemetry
+from artifact import default_model_path, load_scorer
+from cache import ScoreCache, file_fingerprint
+from scoring import DEFAULT_THRESHOLD, ENCODER, score_chunks
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+
+
+def detect_format(name):
+    """Return 'parquet' or 'csv' from a file name."""
+    return 'parquet' if str(name).lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+# --- Readers ---
+def csv_dtypes(columns):
+    """
+    Explicit dtypes for the columns of a CSV header, so chunks parsed separately share
+    one schema: pass-through columns are read as text and decimal model columns as
+    float64. Integer and categorical model columns, which the encoder validates, are inferred.
+    """
+    spec = {column['name']: column for column in ENCODER.spec['columns']}
+    dtypes = {}
+    for name in columns:
+        column = spec.get(name)
+        if column is None:
+            dtypes[name] = 'string'
+        elif column['type'] == 'numeric' and isinstance(column.get('min'), float):
+            dtypes[name] = 'float64'
+    return dtypes
+
+
+def read_csv_columns(source):
+    """Column names of a CSV path or seekable binary file object, leaving the file position unchanged."""
+    if isinstance(source, (str, os.PathLike)):
+        return pd.read_csv(source, nrows=0).columns
+    position = source.tell()
+    try:
+        return pd.read_csv(source, nrows=0).columns
+    finally:
+        source.seek(position)
+
+
+def iter_input_chunks(source, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of at most chunk_size rows from a path or binary file object."""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(source)
+        for record_batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield record_batch.to_pandas()
+    else:
+        with pd.read_csv(source, chunksize=chunk_size, dtype=csv_dtypes(read_csv_columns(source))) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+# --- Writers ---
+def write_output_chunks(chunks, destination, fmt='csv'):
+    """Stream scored chunks to a path or binary file object; returns the number of rows written."""
+    rows = 0
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(destination, table.schema)
+                elif not table.schema.equals(writer.schema):
+                    table = table.cast(writer.schema)  # e.g. an inferred int64 column that is float64 in the first chunk
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        header = True
+        for chunk in chunks:
+            data = chunk.to_csv(index=False, header=header).encode('utf-8')
+            if isinstance(destination, (str, os.PathLike)):
+                with open(destination, 'wb' if header else 'ab') as file:
+                    file.write(data)
+            else:
+                destination.write(data)
+            header = False
+            rows += len(chunk)
+    return rows
+
+
+def score_file(scorer, source, destination, input_format='csv', output_format='csv',
+               chunk_size=DEFAULT_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD, cache=None, on_progress=None,
+               explain=0):
+    """
+    Score every row of `source` into `destination`, chunk by chunk.
+    `on_progress(rows_done)` is called after each chunk if given. With `explain`, the
+    top drivers of each client are added (see scoring.score_chunks). Returns the row count.
+    """
+    def tracked(chunks):
+        done = 0
+        for chunk in chunks:
+            done += len(chunk)
+            yield chunk
+            if on_progress is not None:
+                on_progress(done)
+
+    chunks = iter_input_chunks(source, input_format, chunk_size)
+    return write_output_chunks(tracked(score_chunks(scorer, chunks, threshold, cache, explain)), destination, output_format)
+
+
+# --- Parallel Sharded Scoring ---
+def plan_shards(path, fmt='csv', shard_bytes=DEFAULT_SHARD_BYTES):
+    """
+    Split an input file into independently readable shards, in input order.
+    CSV shards are byte ranges cut at line starts, so they assume no quoted field spans
+    several lines; Parquet shards are runs of whole row groups of about `shard_bytes`.
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(path).metadata
+        shards, groups, size = [], [], 0
+        for index in range(metadata.num_row_groups):
+            groups.append(index)
+            size += metadata.row_group(index).total_byte_size
+            if size >= shard_bytes:
+                shards.append(('parquet', path, groups))
+                groups, size = [], 0
+        if groups or not shards:
+            shards.append(('parquet', path, groups))
+        return shards
+
+    with open(path, 'rb') as file:
+        header = file.readline()
+        end = file.seek(0, io.SEEK_END)
+        bounds = [len(header)]
+        while bounds[-1] < end:
+            file.seek(min(bounds[-1] + shard_bytes, end))
+            file.readline()  # Move to the start of the next line
+            bounds.append(min(file.tell(), end))
+    return [('csv', path, header, start, stop) for start, stop in zip(bounds, bounds[1:])] or [('csv', path, header, bounds[0], bounds[0])]
+
+
+def iter_shard_chunks(shard, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of at most chunk_size rows from one shard of plan_shards."""
+    if shard[0] == 'parquet':
+        import pyarrow.parquet as pq
+        _, path, groups = shard
+        if groups:
+            for record_batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, row_groups=groups):
+                yield record_batch.to_pandas()
+        return
+    _, path, header, start, stop = shard
+    # An empty range (header-only file) is still parsed, so the output keeps its scored header like the serial path.
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(max(stop - start, 0))
+    dtypes = csv_dtypes(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+    with pd.read_csv(io.BytesIO(header + data), chunksize=chunk_size, dtype=dtypes) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+_worker = {}
+
+
+def _init_worker(model_path):
+    # Runs once per worker process: the model is loaded there, never pickled per task.
+    _worker['scorer'] = load_scorer(model_path)
+
+
+def _score_shard(shard, part_path, output_format, chunk_size, threshold, explain):
+    chunks = iter_shard_chunks(shard, chunk_size)
+    return write_output_chunks(score_chunks(_worker['scorer'], chunks, threshold, explain=explain), part_path, output_format)
+
+
+def unify_part_schemas(schemas):
+    """
+    One Arrow schema for tables whose column types were inferred separately: types are
+    widened where Arrow can promote them (null or int64 to float64...), and columns whose
+    types cannot be reconciled become strings.
+    """
+    import pyarrow as pa
+
+    if all(schema.equals(schemas[0]) for schema in schemas):
+        return schemas[0]
+    fields = []
+    for position, field in enumerate(schemas[0]):
+        try:
+            fields.append(pa.unify_schemas([pa.schema([schema.field(position)]) for schema in schemas],
+                                           promote_options='permissive').field(0))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields.append(pa.field(field.name, pa.large_string()))
+    return pa.schema(fields)  # The pandas metadata of one part would no longer describe the merged types
+
+
+def merge_parts(part_paths, destination, fmt='csv'):
+    """Concatenate scored shard files, in order, into `destination` (path or binary file object)."""
+    parts = [path for path in part_paths if os.path.exists(path) and os.path.getsize(path)]
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        files = [pq.ParquetFile(path) for path in parts]
+        if not files:
+            return
+        schema = unify_part_schemas([part.schema_arrow for part in files])
+        with pq.ParquetWriter(destination, schema) as writer:
+            for part in files:
+                for index in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(index).cast(schema))
+        return
+    output = open(destination, 'wb') if isinstance(destination, (str, os.PathLike)) else destination
+    try:
+        for position, path in enumerate(parts):
+            with open(path, 'rb') as part:
+                if position:
+                    part.readline()  # Only the first shard keeps its header
+                shutil.copyfileobj(part, output)
+    finally:
+        if output is not destination:
+            output.close()
+
+
+def score_file_parallel(model_path, source, destination, input_format='csv', output_format='csv',
+                        chunk_size=DEFAULT_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD, on_progress=None,
+                        explain=0, workers=None, shard_bytes=DEFAULT_SHARD_BYTES):
+    """
+    Score the file at `source` with a pool of `workers` processes (default: one per CPU),
+    each loading the model from `model_path` once. Shards are written to temporary part
+    files and merged in input order; `on_progress(rows_done)` is called as shards finish.
+    Returns the row count.
+    """
+    shards = plan_shards(source, input_format, shard_bytes)
+    part_dir = tempfile.mkdtemp(prefix='churn-shards-')
+    part_paths = [os.path.join(part_dir, f"part-{index:05d}.{output_format}") for index in range(len(shards))]
+    rows = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(model_path,)) as pool:
+            futures = [pool.submit(_score_shard, shard, part_path, output_format, chunk_size, threshold, explain)
+                       for shard, part_path in zip(shards, part_paths)]
+            for future in futures:
+                rows += future.result()
+                if on_progress is not None:
+                    on_progress(rows)
+        with telemetry.timed('batch_merge_seconds', format=output_format):
+            merge_parts(part_paths, destination, output_format)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scoring de désabonnement par lot (CSV/Parquet).")
+    parser.add_argument('input', help="Fichier d'entrée (.csv ou .parquet)")
+    parser.add_argument('output', help="Fichier de sortie (.csv ou .parquet)")
+    parser.add_argument('--model', default=None,
+                        help="Artefact .npz ou pickle du modèle (défaut : la version active de MODEL_DIR, sinon model.npz)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Nombre de lignes par bloc (défaut : {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Seuil de décision sur P(désabonnement) (défaut : {DEFAULT_THRESHOLD})")
+    parser.add_argument('--cache-db', default=None,
+                        help="Fichier SQLite de cache des scores (désactivé par défaut)")
+    parser.add_argument('--explain', type=int, default=0, metavar='N',
+                        help="Ajouter les N principaux facteurs de chaque client (colonnes ChurnDriver*)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processus de scoring en parallèle ; 0 = un par cœur (défaut : 1, sans découpage)")
+    parser.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_BYTES / 2**20,
+                        help="Taille visée de chaque tranche du fichier d'entrée, en Mo (défaut : 64)")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size doit être strictement positif.")
+    if not 0.0 <= args.threshold <= 1.0:
+        parser.error("--threshold doit être compris entre 0 et 1.")
+    if args.explain < 0:
+        parser.error("--explain doit être positif ou nul.")
+    if args.workers < 0 or args.shard_mb <= 0:
+        parser.error("--workers doit être positif ou nul et --shard-mb strictement positif.")
+    if args.workers != 1 and args.cache_db:
+        parser.error("--cache-db n'est pas disponible avec plusieurs processus (--workers).")
+    args.model = args.model or default_model_path()
+
+    if args.workers != 1:
+        start = time.perf_counter()
+        rows = score_file_parallel(args.model, args.input, args.output,
+                                   input_format=detect_format(args.input),
+                                   output_format=detect_format(args.output),
+                                   chunk_size=args.chunk_size,
+                                   threshold=args.threshold,
+                                   explain=args.explain,
+                                   workers=args.workers or None,
+                                   shard_bytes=int(args.shard_mb * 2**20),
+                                   on_progress=lambda done: print(f"\r{done} clients scorés...", end='', file=sys.stderr))
+        print(f"\n{rows} clients scorés en {time.perf_counter() - start:.2f} s "
+              f"({args.workers or os.cpu_count()} processus) -> {args.output}", file=sys.stderr)
+        telemetry.export_files(force=True)
+        return 0
+
+    scorer = load_scorer(args.model)
+    cache = ScoreCache(file_fingerprint(args.model), db_path=args.cache_db) if args.cache_db else None
+    start = time.perf_counter()
+    rows = score_file(scorer, args.input, args.output,
+                      input_format=detect_format(args.input),
+                      output_format=detect_format(args.output),
+                      chunk_size=args.chunk_size,
+                      threshold=args.threshold,
+                      cache=cache,
+                      explain=args.explain)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} clients scorés en {elapsed:.2f} s -> {args.output}", file=sys.stderr)
+    if cache is not None:
+        print(f"Cache : {cache.stats()}", file=sys.stderr)
+    telemetry.export_files(force=True)  # TELEMETRY_PROM_FILE / TELEMETRY_JSON_LOG, s'ils sont définis
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
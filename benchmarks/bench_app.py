@@ -0,0 +1,222 @@
+"""
+End-to-end latency benchmark of the Streamlit app against the local mock LLM backend.
+
+Drives full chat turns and prediction submissions through Streamlit's AppTest and
+reports p50/p95/p99 latency, throughput, errors and resident memory per concurrency
+level. AppTest is not thread-safe, so each virtual user of the `chat` and `predict`
+scenarios is its own process. The `pipeline` scenario runs chat turns from threads of
+one process through the shared job pool, Groq client and score cache, which is where
+sessions of a real server contend (CHAT_MAX_CONCURRENCY).
+
+    python benchmarks/bench_app.py --scenario chat predict pipeline --concurrency 1 4 8 --iterations 10
+    python benchmarks/bench_app.py --scenario chat --failure-rate 0.1 --failure-mode stream_break --json out.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP_PATH = os.path.join(ROOT, 'app.py')
+QUESTIONS = [
+    "Quel est le risque pour un client de 45 ans en Allemagne avec 2 produits ?",
+    "Comment fidéliser un client inactif depuis six mois ?",
+    "Compare un client de 30 ans en France et un client de 60 ans en Espagne.",
+]
+
+
+def rss_mb():
+    """Current resident set size of the process (Linux), falling back to the peak."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def new_session(page=None):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.secrets['GROQ_API_KEY'] = 'benchmark'
+    if page:
+        at.query_params['page'] = page
+    at.run()
+    return at
+
+
+# --- Scenarios ---
+def chat_turn(at, iteration):
+    """Send one message and wait until its answer is stored in the history; returns seconds."""
+    start = time.perf_counter()
+    history = at.session_state['messages']
+    expected = len(history) + 2
+    at.text_input(key='chat_text_input').set_value(QUESTIONS[iteration % len(QUESTIONS)])
+    next(b for b in at.button if 'Envoyer' in str(b.label)).click().run()
+    while True:
+        job = at.session_state['chat_job'] if 'chat_job' in at.session_state else None
+        if job is None or job.done:
+            at.run()  # Rerun that stores the finished turn, as the polling fragment would trigger
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    if at.exception or len(at.session_state['messages']) < expected:
+        raise RuntimeError([e.value for e in at.exception] or "réponse manquante")
+    return elapsed
+
+
+def predict_submission(at, iteration):
+    """Submit the prediction form and render the result; returns seconds."""
+    start = time.perf_counter()
+    next(b for b in at.button if 'Prédire' in str(b.label)).click().run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError([e.value for e in at.exception])
+    at.button(key='new_prediction_btn').click().run()
+    return elapsed
+
+
+def pipeline_turn(state, iteration):
+    """One chat turn through the process-wide job pool, without the UI; returns seconds."""
+    from jobs import get_runner
+    from llm_client import chat_reply
+
+    client, tools = state
+    messages = [{"role": "user", "content": QUESTIONS[iteration % len(QUESTIONS)]}]
+    start = time.perf_counter()
+    job = get_runner().submit(lambda job: chat_reply(client, messages, on_text=job.stream_text,
+                                                     tools=tools.definitions, run_tool=tools))
+    job.future.result()
+    if job.error is not None:
+        raise job.error
+    return time.perf_counter() - start
+
+
+def pipeline_state():
+    from artifact import default_model_path, load_scorer
+    from cache import ScoreCache, file_fingerprint
+    from chat_tools import ChurnTools
+    from llm_client import client_settings, get_client
+
+    model_path = default_model_path()
+    return get_client('benchmark', client_settings()), ChurnTools(load_scorer(model_path), cache=ScoreCache(file_fingerprint(model_path)))
+
+
+def chat_session():
+    return new_session('chatbot')
+
+
+SCENARIOS = {
+    'chat': (chat_session, chat_turn),
+    'predict': (new_session, predict_submission),
+    'pipeline': (pipeline_state, pipeline_turn),
+}
+
+
+def virtual_user(scenario, iterations, ready, results):
+    """Load a session, wait for every user to be ready, then time `iterations` operations."""
+    setup, operation = SCENARIOS[scenario]
+    latencies, errors = [], []
+    try:
+        state = setup()
+    except Exception as e:
+        errors.append(repr(e))
+        state = None
+    ready.wait()
+    for iteration in range(iterations if state is not None else 0):
+        try:
+            latencies.append(operation(state, iteration))
+        except Exception as e:
+            errors.append(repr(e))
+    results.put((latencies, errors, rss_mb()))
+
+
+def run_level(scenario, concurrency, iterations):
+    """Run `concurrency` virtual users doing `iterations` operations each; returns the report row."""
+    if scenario == 'pipeline':
+        import queue
+        ready, results = threading.Barrier(concurrency + 1), queue.Queue()
+        workers = [threading.Thread(target=virtual_user, args=(scenario, iterations, ready, results))
+                   for _ in range(concurrency)]
+    else:
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Barrier(concurrency + 1), context.Queue()
+        workers = [context.Process(target=virtual_user, args=(scenario, iterations, ready, results))
+                   for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    ready.wait()  # Sessions are loaded: only the operations are timed
+    start = time.perf_counter()
+    reports = [results.get() for _ in workers]
+    wall = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    latencies = [latency for report in reports for latency in report[0]]
+    errors = [error for report in reports for error in report[1]]
+    ms = np.array(latencies) * 1000
+    row = {
+        'scenario': scenario, 'concurrency': concurrency, 'ops': len(latencies), 'errors': len(errors),
+        'throughput_per_s': len(latencies) / wall if wall else 0.0,
+        # Processes: resident memory summed over the users; threads: the shared process.
+        'rss_mb': rss_mb() if scenario == 'pipeline' else sum(report[2] for report in reports),
+    }
+    for name, q in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99)):
+        row[name] = float(np.percentile(ms, q)) if len(ms) else float('nan')
+    row['mean_ms'] = float(ms.mean()) if len(ms) else float('nan')
+    if errors:
+        row['first_error'] = errors[0]
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=['chat', 'predict', 'pipeline'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--iterations', type=int, default=10, help="Opérations par utilisateur virtuel")
+    parser.add_argument('--ttft-ms', type=float, default=150.0)
+    parser.add_argument('--token-ms', type=float, default=15.0)
+    parser.add_argument('--transcription-ms', type=float, default=300.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', choices=['error', 'timeout', 'stream_break'], default='error')
+    parser.add_argument('--json', help="Écrire aussi les résultats dans ce fichier JSON")
+    args = parser.parse_args(argv)
+
+    # The app builds its client from these at import time: set them before the first session.
+    os.environ.update({
+        'CHAT_BACKEND': 'mock',
+        'MOCK_LLM_TTFT_MS': str(args.ttft_ms),
+        'MOCK_LLM_TOKEN_MS': str(args.token_ms),
+        'MOCK_TRANSCRIPTION_MS': str(args.transcription_ms),
+        'MOCK_FAILURE_RATE': str(args.failure_rate),
+        'MOCK_FAILURE_MODE': args.failure_mode,
+        'SCORE_CACHE_DB': os.environ.get('SCORE_CACHE_DB', ''),  # No on-disk cache left behind
+    })
+    os.chdir(ROOT)  # The app reads style.css and the model relative to the working directory
+
+    rows = []
+    header = f"{'scenario':<9}{'conc':>5}{'ops':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>9}{'RSS MB':>9}"
+    print(header)
+    for scenario in args.scenario:
+        for concurrency in args.concurrency:
+            row = run_level(scenario, concurrency, args.iterations)
+            rows.append(row)
+            print(f"{scenario:<9}{concurrency:>5}{row['ops']:>6}{row['errors']:>5}{row['p50_ms']:>10.1f}"
+                  f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['throughput_per_s']:>9.2f}{row['rss_mb']:>9.1f}")
+            if row['errors']:
+                print(f"    première erreur : {row['first_error']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(rows, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Rows/s scaling of the sharded batch scorer from 1 to N worker processes.
+
+Generates a synthetic client file (valid values drawn from encoder_spec.json), scores it
+once with the single-process chunked scorer as the baseline, then with the process
+pool at each worker count, and reports throughput and speedup.
+
+    python benchmarks/bench_batch_scaling.py --rows 5000000 --workers 1 2 4 8
+    python benchmarks/bench_batch_scaling.py --format parquet --explain 3 --json scaling.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_clients(rows, seed=0):
+    """Random clients whose every value passes the encoder's validation."""
+    from scoring import ENCODER
+
+    rng = np.random.default_rng(seed)
+    data = {}
+    for column in ENCODER.spec['columns']:
+        name = column['name']
+        if column['type'] == 'categorical':
+            data[name] = rng.choice(list(column['categories']), size=rows)
+        else:
+            low = column['min']
+            high = column['max'] if column['max'] is not None else column['sweep']['stop']
+            values = rng.uniform(low, high, size=rows)
+            data[name] = values.round().astype(np.int64) if isinstance(low, int) else values.round(2)
+    return pd.DataFrame(data)
+
+
+def write_input(path, rows, fmt, chunk_rows=100_000):
+    """Write the synthetic file chunk by chunk (one Parquet row group per chunk), so memory stays bounded."""
+    from batch import write_output_chunks
+
+    chunks = (synthetic_clients(min(chunk_rows, rows - start), seed=start) for start in range(0, rows, chunk_rows))
+    return write_output_chunks(chunks, path, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workers', nargs='+', type=int, default=None,
+                        help="Nombres de processus à mesurer (défaut : 1, 2, 4… jusqu'au nombre de cœurs)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--shard-mb', type=float, default=16.0)
+    parser.add_argument('--explain', type=int, default=0)
+    parser.add_argument('--json', help="Écrire aussi les résultats dans ce fichier JSON")
+    args = parser.parse_args(argv)
+
+    from artifact import default_model_path, load_scorer
+    from batch import score_file, score_file_parallel
+
+    os.chdir(ROOT)  # The default model path is relative to the repository
+    model_path = default_model_path()
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores} | {cores})
+    if any(count <= 0 for count in workers):
+        parser.error("--workers : les nombres de processus doivent être strictement positifs.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, f"clients.{args.format}")
+        destination = os.path.join(directory, f"scores.{args.format}")
+        print(f"Génération de {args.rows} clients ({args.format})...", file=sys.stderr)
+        write_input(source, args.rows, args.format)
+        print(f"Fichier d'entrée : {os.path.getsize(source) / 2**20:.1f} Mo, {cores} cœur(s) disponibles", file=sys.stderr)
+
+        results = []
+        start = time.perf_counter()
+        score_file(load_scorer(model_path), source, destination, args.format, args.format, explain=args.explain)
+        serial = time.perf_counter() - start
+        results.append({'mode': 'séquentiel', 'workers': 1, 'seconds': serial, 'rows_per_s': args.rows / serial})
+
+        for count in workers:
+            start = time.perf_counter()
+            rows = score_file_parallel(model_path, source, destination, args.format, args.format,
+                                       explain=args.explain, workers=count, shard_bytes=int(args.shard_mb * 2**20))
+            elapsed = time.perf_counter() - start
+            assert rows == args.rows, (rows, args.rows)
+            results.append({'mode': 'parallèle', 'workers': count, 'seconds': elapsed, 'rows_per_s': rows / elapsed})
+
+    baseline = results[0]['rows_per_s']  # Single-process chunked scorer
+    print(f"{'mode':<12}{'processus':>10}{'secondes':>10}{'lignes/s':>14}{'accélération':>14}")
+    for row in results:
+        row['speedup'] = row['rows_per_s'] / baseline
+        print(f"{row['mode']:<12}{row['workers']:>10}{row['seconds']:>10.2f}{row['rows_per_s']:>14,.0f}{row['speedup']:>13.2f}x")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Compare the NumPy GaussianNB scorer against sklearn: agreement, per-row latency and
+batch throughput.
+
+    python benchmarks/bench_scoring.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import compile_model, load_model_file  # noqa: E402
+
+
+def best_of(func, repeat):
+    """Return the fastest wall time of `repeat` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='model.pkl')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--single-calls', type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    model = load_model_file(args.model)
+    scorer = compile_model(model)
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((args.rows, scorer.n_features))
+
+    max_diff = np.abs(model.predict_proba(X[:100_000]) - scorer.predict_proba(X[:100_000])).max()
+    print(f"max |sklearn - numpy| : {max_diff:.3e}")
+
+    row = X[:1]
+    for name, func in [('sklearn', lambda: model.predict_proba(row)), ('numpy', lambda: scorer.score(row))]:
+        elapsed = best_of(lambda: [func() for _ in range(args.single_calls)], 3)
+        print(f"{name:8s} latence 1 ligne : {elapsed / args.single_calls * 1e6:8.1f} µs")
+
+    for name, func in [('sklearn', lambda: model.predict_proba(X)), ('numpy', lambda: scorer.score(X))]:
+        elapsed = best_of(func, 3)
+        print(f"{name:8s} débit lot       : {args.rows / elapsed / 1e6:8.2f} M lignes/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
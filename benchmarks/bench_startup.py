@@ -0,0 +1,58 @@
+"""
+Cold-start and per-rerun cost of app.py, by phase.
+
+Each page is measured in a fresh Python process: the first script run is the cold
+start (imports, model load, CSS read); the following reruns show the per-interaction
+overhead once everything is cached.
+
+    python benchmarks/bench_startup.py --reruns 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_page(page, reruns):
+    """Run in a child process: cold run then `reruns` warm runs of one page; prints the summary as JSON."""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    at.secrets['GROQ_API_KEY'] = 'benchmark'
+    if page:
+        at.query_params['page'] = page
+    for _ in range(reruns + 1):
+        at.run()
+    import rerun_timing
+    print(json.dumps(rerun_timing.summary()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=20)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child is not None:
+        measure_page(args.child or None, args.reruns)
+        return 0
+
+    env = dict(os.environ, CHAT_BACKEND='mock', SCORE_CACHE_DB='')
+    for label, page in (('prédiction', ''), ('chatbot', 'chatbot')):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', page, '--reruns', str(args.reruns)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        summary = json.loads(output.strip().splitlines()[-1])
+        cold = summary['cold']
+        print(f"Page {label} : démarrage à froid {cold['total_ms']:.1f} ms, "
+              f"passage à chaud {summary['warm_total_ms']:.1f} ms (moyenne sur {summary['warm_runs']})")
+        for phase, ms in cold['phases']:
+            print(f"    {phase:<16}{ms:>10.2f} ms à froid{summary['warm_phases_ms'].get(phase, float('nan')):>10.2f} ms à chaud")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Prediction cache keyed on the encoded feature vector and the model file fingerprint.
+
+Two tiers: an in-memory LRU shared by every session of the process, and an optional
+SQLite file that survives restarts. The disk tier stores the fingerprint of the model
+that produced its entries and is emptied as soon as a different model is opened.
+"""
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, used to tie cached scores to one model version."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def feature_key(x):
+    """Stable hash of one encoded feature vector."""
+    return hashlib.sha256(np.ascontiguousarray(x, dtype=np.float64).tobytes()).hexdigest()
+
+
+# --- In-Memory Tier ---
+class LRUCache:
+    """
+    Thread-safe least-recently-used mapping with hit/miss/eviction counters.
+    With `max_bytes`, entries are also evicted to keep the sum of `sizeof(value)` under it.
+    """
+
+    def __init__(self, max_entries=10_000, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.bytes -= self._sizeof(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.bytes += self._sizeof(value)
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes and self._data):
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self.bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+# --- Two-Tier Score Cache ---
+class ScoreCache:
+    """
+    P(churn) cache for encoded clients. `db_path=None` keeps it in memory only.
+    Keys combine the model fingerprint and the feature hash, so a new model never
+    reads scores produced by an old one.
+    """
+
+    def __init__(self, model_fingerprint, max_entries=10_000, db_path=None, max_disk_entries=1_000_000):
+        self.model_fingerprint = model_fingerprint
+        self.memory = LRUCache(max_entries)
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db_lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, churn_probability REAL)")
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'model_fingerprint'").fetchone()
+            if row is None or row[0] != self.model_fingerprint:
+                # Model changed since the file was written: every stored score is stale.
+                self._db.execute("DELETE FROM scores")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('model_fingerprint', ?)", (self.model_fingerprint,))
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def _key(self, x):
+        return f"{self.model_fingerprint[:16]}:{feature_key(x)}"
+
+    def get(self, x):
+        """Cached P(churn) for one encoded client, or None."""
+        key = self._key(x)
+        value = self.memory.get(key)
+        if value is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT churn_probability FROM scores WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = row[0]
+                self.disk_hits += 1
+                self.memory.put(key, value)
+        return value
+
+    def put(self, x, churn_probability):
+        self.put_many(np.asarray(x, dtype=np.float64).reshape(1, -1), [churn_probability])
+
+    def get_many(self, X):
+        """Look up every row of X; returns (P(churn) with NaN for misses, boolean miss mask)."""
+        values = np.array([self.get(x) for x in X], dtype=np.float64)
+        return values, np.isnan(values)
+
+    def put_many(self, X, churn_probabilities):
+        rows = [(self._key(x), float(p)) for x, p in zip(X, churn_probabilities)]
+        for key, value in rows:
+            self.memory.put(key, value)
+        if self._db is not None and rows:
+            with self._db_lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?)", rows)
+                # Upper bound (replacements do not add rows); only recount when it crosses the cap.
+                self._disk_entries += len(rows)
+                if self._disk_entries > self.max_disk_entries:
+                    self._disk_entries = self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+                    excess = self._disk_entries - self.max_disk_entries
+                    if excess > 0:
+                        # Trim the oldest insertions back under the cap.
+                        self._db.execute("DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY rowid LIMIT ?)", (excess,))
+                        self.disk_evictions += excess
+                        self._disk_entries = self.max_disk_entries
+
+    def clear(self):
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM scores")
+                self._disk_entries = 0
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {
+            "entries": memory["entries"],
+            "hits": memory["hits"] + self.disk_hits,
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": memory["misses"] - self.disk_hits,
+            "evictions": memory["evictions"],
+            "disk_entries": self._disk_entries if self._db is not None else 0,
+            "disk_evictions": self.disk_evictions,
+        }
@@ -0,0 +1,162 @@
+"""
+Conversation context sent with each chat completion.
+
+The prompt is a churn-domain system prompt, a running summary of the older turns, and
+as many of the most recent turns as fit in CHAT_CONTEXT_TOKENS (estimated locally,
+without a tokenizer download). When the history outgrows the budget, the oldest
+turns are folded into the summary once and never resent verbatim, so the prompt
+size stays bounded however long the session runs.
+"""
+import os
+import re
+
+CHAT_CONTEXT_TOKENS = int(os.environ.get('CHAT_CONTEXT_TOKENS', '3000'))
+CHAT_SUMMARY_TOKENS = int(os.environ.get('CHAT_SUMMARY_TOKENS', '400'))
+# Once over budget, recent turns are trimmed down to this fraction of it, so the
+# summary is refreshed every few turns rather than on every message.
+CHAT_CONTEXT_LOW_WATER = float(os.environ.get('CHAT_CONTEXT_LOW_WATER', '0.6'))
+
+SYSTEM_PROMPT = (
+    "Tu es l'assistant virtuel de ClientInsight Pro, une application de prédiction du "
+    "désabonnement (churn) des clients bancaires. Tu aides les conseillers à interpréter "
+    "le risque de départ d'un client à partir de son pays, son genre, son âge, son "
+    "ancienneté, son solde, son nombre de produits, sa carte de crédit, son statut de "
+    "membre actif, son salaire estimé et son score de crédit, et tu proposes des actions "
+    "de fidélisation concrètes. Pour chiffrer un risque, appelle l'outil score_clients (tous "
+    "les clients de la question en un seul appel) plutôt que d'estimer toi-même, et précise les "
+    "valeurs supposées par défaut. Réponds en français, de façon concise."
+)
+SUMMARY_HEADER = "Résumé de la conversation précédente :"
+SUMMARY_PROMPT = (
+    "Résume la conversation suivante entre un conseiller et l'assistant en quelques phrases, "
+    "en conservant les clients évoqués, leurs caractéristiques, les risques estimés et les "
+    "décisions prises. Intègre le résumé précédent s'il existe. Réponds uniquement par le résumé."
+)
+
+ROLE_MAP = {'user': 'user', 'bot': 'assistant', 'assistant': 'assistant'}
+MESSAGE_OVERHEAD_TOKENS = 4
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+# --- Token Estimation ---
+def estimate_tokens(text):
+    """
+    Cheap local token estimate: words and punctuation marks, with long words counted
+    as one token per four characters, as BPE vocabularies tend to split them.
+    """
+    return sum(max(1, len(piece) // 4) for piece in _TOKEN_PATTERN.findall(text or ''))
+
+
+def message_tokens(content):
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text, max_tokens, keep='end'):
+    """Cut `text` on word boundaries so it fits in `max_tokens`, keeping its start or its end."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    if keep == 'end':
+        words.reverse()
+    kept, used = [], 0
+    for word in words:
+        used += estimate_tokens(word)
+        if used > max_tokens:
+            break
+        kept.append(word)
+    if keep == 'end':
+        kept.reverse()
+    return ' '.join(kept)
+
+
+# --- Summaries ---
+def local_summary(previous, turns, max_tokens=CHAT_SUMMARY_TOKENS):
+    """Extractive fallback: one clipped line per turn appended to the previous summary, oldest lines dropped first."""
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        speaker = "Conseiller" if ROLE_MAP.get(turn.role) == 'user' else "Assistant"
+        lines.append(f"{speaker} : {truncate_to_tokens(turn.content, 40, keep='start')}")
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_to_tokens('\n'.join(lines), max_tokens)
+
+
+def llm_summarizer(client, model, max_tokens=CHAT_SUMMARY_TOKENS):
+    """Summarizer calling the chat model once per fold with the previous summary and the evicted turns."""
+    def summarize(previous, turns):
+        transcript = '\n'.join(
+            f"{'Conseiller' if ROLE_MAP.get(turn.role) == 'user' else 'Assistant'} : {turn.content}" for turn in turns
+        )
+        content = f"Résumé précédent :\n{previous}\n\nNouveaux échanges :\n{transcript}" if previous else transcript
+        completion = client.chat.completions.create(
+            model=model, max_tokens=max_tokens, temperature=0.0,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}],
+        )
+        return completion.choices[0].message.content
+    return summarize
+
+
+# --- Context Window ---
+class ConversationContext:
+    """Per-session prompt builder; remembers the summary and how far into the history it goes."""
+
+    def __init__(self, budget_tokens=CHAT_CONTEXT_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS,
+                 system_prompt=SYSTEM_PROMPT):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.system_prompt = system_prompt
+        self.summary = ''
+        self.summarized_through = 0  # Absolute index (dropped messages included) of the first unsummarized turn
+        self.summary_updates = 0
+        self.last_prompt_tokens = 0
+
+    def build(self, history, summarize=None, extra=()):
+        """
+        Chat completion messages for `history` (a ChatHistory) followed by `extra`, turns
+        not stored yet (e.g. the message being answered). Turns that no longer fit are
+        folded into the summary, with `summarize(previous, turns)` when given and the
+        local extractive summary otherwise (or if it fails).
+        """
+        start = max(self.summarized_through - history.dropped, 0)
+        pending = list(history)[start:] + list(extra)
+        # The summary slot is always reserved, so folding turns into it cannot overflow the budget.
+        reserved = message_tokens(self.system_prompt) + message_tokens(SUMMARY_HEADER) + self.summary_tokens
+        budget = max(self.budget_tokens - reserved, 0)
+        costs = [message_tokens(message.content) for message in pending]
+        if sum(costs) > budget:
+            keep = self._newest_fitting(costs, budget * CHAT_CONTEXT_LOW_WATER)
+            evicted = pending[:len(pending) - keep]
+            self._fold(evicted, summarize)
+            self.summarized_through = history.dropped + start + len(evicted)
+            pending = pending[len(evicted):]
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{self.summary}"})
+        messages += [{"role": ROLE_MAP.get(message.role, 'user'), "content": message.content} for message in pending]
+        self.last_prompt_tokens = sum(message_tokens(message['content']) for message in messages)
+        return messages
+
+    @staticmethod
+    def _newest_fitting(costs, budget):
+        """How many of the newest turns fit in `budget`; the latest turn is always kept."""
+        used = 0
+        for count, cost in enumerate(reversed(costs)):
+            if count and used + cost > budget:
+                return count
+            used += cost
+        return len(costs)
+
+    def _fold(self, turns, summarize):
+        if not turns:
+            return
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(self.summary, turns)
+            except Exception:
+                summary = None # Repli sur le résumé local ci-dessous
+        if not summary:
+            summary = local_summary(self.summary, turns, self.summary_tokens)
+        self.summary = truncate_to_tokens(summary, self.summary_tokens)
+        self.summary_updates += 1
@@ -0,0 +1,81 @@
+"""
+Compact, bounded chat history.
+
+Each session keeps its messages as small named tuples in a deque capped at
+CHAT_HISTORY_MAX_MESSAGES; the oldest turns fall off once the cap is reached. Recorded
+audio is not stored in the session at all: the decoded bytes go once into a
+process-wide blob store and messages only keep the blob id.
+"""
+import hashlib
+import os
+import sys
+from collections import deque, namedtuple
+
+from cache import LRUCache
+
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get('CHAT_HISTORY_MAX_MESSAGES', '200'))
+CHAT_VISIBLE_MESSAGES = int(os.environ.get('CHAT_VISIBLE_MESSAGES', '20'))
+AUDIO_BLOB_STORE_BYTES = int(os.environ.get('AUDIO_BLOB_STORE_BYTES', str(64 * 1024 * 1024)))
+
+ChatMessage = namedtuple('ChatMessage', ['role', 'content', 'audio_id', 'timing'])
+
+
+# --- Shared Audio Blobs ---
+class AudioBlobStore:
+    """Process-wide store of decoded audio clips, addressed by content hash, LRU-evicted by size."""
+
+    def __init__(self, max_bytes=AUDIO_BLOB_STORE_BYTES):
+        self._blobs = LRUCache(max_entries=sys.maxsize, max_bytes=max_bytes, sizeof=len)
+
+    def put(self, data):
+        """Store a clip once and return its id; identical clips share one entry."""
+        blob_id = hashlib.sha256(data).hexdigest()
+        if self._blobs.get(blob_id) is None:
+            self._blobs.put(blob_id, bytes(data))
+        return blob_id
+
+    def get(self, blob_id):
+        """Clip bytes, or None if it has been evicted."""
+        return self._blobs.get(blob_id)
+
+    def stats(self):
+        return self._blobs.stats()
+
+
+# --- Per-Session History ---
+class ChatHistory:
+    """Bounded message list for one session."""
+
+    def __init__(self, max_messages=CHAT_HISTORY_MAX_MESSAGES, greeting=None):
+        self._messages = deque(maxlen=max_messages)
+        self.dropped = 0
+        if greeting:
+            self.append('bot', greeting)
+
+    def append(self, role, content, audio_id=None, timing=None):
+        if len(self._messages) == self._messages.maxlen:
+            self.dropped += 1
+        self._messages.append(ChatMessage(role, content, audio_id, timing))
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def split(self, visible=CHAT_VISIBLE_MESSAGES):
+        """(older, recent) where `recent` holds the last `visible` messages."""
+        messages = list(self._messages)
+        cut = max(len(messages) - visible, 0)
+        return messages[:cut], messages[cut:]
+
+    def memory_bytes(self):
+        """Approximate memory held by this history (message tuples and their strings)."""
+        total = sys.getsizeof(self._messages)
+        for message in self._messages:
+            total += sys.getsizeof(message) + sys.getsizeof(message.content)
+            if message.audio_id is not None:
+                total += sys.getsizeof(message.audio_id)
+            if message.timing is not None:
+                total += sys.getsizeof(message.timing)
+        return total
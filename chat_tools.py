@@ -0,0 +1,123 @@
+"""
+Churn scoring exposed to the chatbot as a function-calling tool.
+
+The tool schema is generated from encoder_spec.json, so the model sees the same
+columns, category labels and numeric bounds as the prediction form. A single tool
+call may describe several hypothetical clients: they are encoded and scored together
+in one vectorized call, through the app's score cache.
+"""
+import json
+import os
+import threading
+import time
+
+from encoder import EncodingError
+from scoring import DEFAULT_THRESHOLD, ENCODER, score_matrix
+
+SCORE_TOOL_NAME = 'score_clients'
+MAX_TOOL_CLIENTS = int(os.environ.get('CHAT_TOOL_MAX_CLIENTS', '50'))
+CHAT_TOOLS_ENABLED = os.environ.get('CHAT_TOOLS', '1') not in ('0', 'false', 'False')
+
+
+# --- Schema ---
+def feature_schema(encoder=ENCODER):
+    """JSON schema of one client, with enums for categorical columns and bounds for numeric ones."""
+    properties = {}
+    for name in encoder.columns:
+        if name in encoder.categorical:
+            properties[name] = {"type": "string", "enum": encoder.options(name)}
+        else:
+            minimum, maximum, _ = encoder.bounds(name)
+            properties[name] = {"type": "number"}
+            if minimum is not None:
+                properties[name]["minimum"] = minimum
+            if maximum is not None:
+                properties[name]["maximum"] = maximum
+    return {"type": "object", "properties": properties}
+
+
+def score_tool_definition(encoder=ENCODER):
+    return {
+        "type": "function",
+        "function": {
+            "name": SCORE_TOOL_NAME,
+            "description": (
+                "Calcule la probabilité de désabonnement (churn) d'un ou plusieurs clients avec le modèle "
+                "de l'application. Regroupe tous les clients d'une question dans un seul appel. Les "
+                "caractéristiques non précisées prennent une valeur par défaut, indiquée dans la réponse."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "clients": {"type": "array", "items": feature_schema(encoder), "minItems": 1,
+                                "maxItems": MAX_TOOL_CLIENTS},
+                },
+                "required": ["clients"],
+            },
+        },
+    }
+
+
+def default_client(encoder=ENCODER):
+    """Values used for features the user did not mention: spec default, or first category."""
+    return {name: encoder.options(name)[0] if name in encoder.categorical else encoder.bounds(name)[2]
+            for name in encoder.columns}
+
+
+# --- Tool Runner ---
+class ChurnTools:
+    """Callable `run_tool(name, arguments)` for chat_reply, timing every call."""
+
+    def __init__(self, scorer, cache=None, threshold=DEFAULT_THRESHOLD, encoder=ENCODER):
+        self.scorer = scorer
+        self.cache = cache
+        self.threshold = threshold
+        self.encoder = encoder
+        self.definitions = [score_tool_definition(encoder)]
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def __call__(self, name, arguments):
+        """Run one tool call; returns the JSON string handed back to the model (errors included)."""
+        start = time.perf_counter()
+        rows = 0
+        try:
+            if name != SCORE_TOOL_NAME:
+                raise ValueError(f"Outil inconnu : {name}")
+            clients = json.loads(arguments or '{}').get('clients') or []
+            rows = len(clients)
+            result = self.score_clients(clients)
+        except (ValueError, AttributeError, TypeError) as e:
+            # json.JSONDecodeError and EncodingError are ValueErrors: the model gets the message and can retry.
+            result = {"error": str(e)}
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.rows += rows
+            self.seconds += elapsed
+        result["latency_ms"] = elapsed * 1000
+        return json.dumps(result, ensure_ascii=False)
+
+    def score_clients(self, clients):
+        if not clients:
+            raise ValueError("Aucun client à évaluer.")
+        if len(clients) > MAX_TOOL_CLIENTS:
+            raise ValueError(f"Trop de clients dans un seul appel ({len(clients)}, maximum {MAX_TOOL_CLIENTS}).")
+        defaults = default_client(self.encoder)
+        records, assumed = [], []
+        for client in clients:
+            if not isinstance(client, dict):
+                raise EncodingError("Chaque client doit être un objet JSON.")
+            records.append({**defaults, **{k: v for k, v in client.items() if v is not None}})
+            assumed.append(sorted(name for name in self.encoder.columns if client.get(name) is None))
+        churn_proba = score_matrix(self.scorer, self.encoder.encode_records(records), self.cache)
+        return {
+            "threshold": self.threshold,
+            "clients": [
+                {"client": record, "valeurs_par_defaut": defaulted,
+                 "churn_probability": round(float(p), 4), "prediction": "départ" if p >= self.threshold else "reste"}
+                for record, defaulted, p in zip(records, assumed, churn_proba)
+            ],
+        }
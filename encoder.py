@@ -0,0 +1,152 @@
+"""
+Table-driven feature encoder.
+
+The column order, categorical lookup tables and valid numeric ranges live in
+encoder_spec.json. The spec is compiled once into sorted NumPy lookup arrays, so a
+single form submission and a million-row extract go through the same vectorized code.
+Unknown categories and out-of-range values are rejected instead of being mapped silently.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'encoder_spec.json')
+
+
+class EncodingError(ValueError):
+    """Raised when input records do not satisfy the encoder spec."""
+
+
+class FeatureEncoder:
+    """Compiled encoder spec: column layout, lookup arrays and numeric bounds."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.columns = [column['name'] for column in spec['columns']]
+        self.numeric = {}
+        self.categorical = {}
+        for column in spec['columns']:
+            if column['type'] == 'categorical':
+                labels = dict(column['categories'])
+                for alias, target in column.get('aliases', {}).items():
+                    labels[alias] = column['categories'][target]
+                keys = np.array(sorted(labels), dtype=str)
+                self.categorical[column['name']] = {
+                    'keys': keys,
+                    'values': np.array([labels[key] for key in keys], dtype=np.float64),
+                    'codes': np.array(sorted(set(column['categories'].values())), dtype=np.float64),
+                    'options': list(column['categories']),
+                    'labels': {float(value): label for label, value in column['categories'].items()},
+                }
+            else:
+                self.numeric[column['name']] = {
+                    'min': -np.inf if column.get('min') is None else float(column['min']),
+                    'max': np.inf if column.get('max') is None else float(column['max']),
+                    'sweep': column.get('sweep'),
+                }
+
+    # --- Encoding ---
+    def _encode_categorical(self, name, values):
+        table = self.categorical[name]
+        array = np.asarray(values)
+        if array.dtype.kind in 'biuf':
+            # Already-encoded numeric input (e.g. HasCrCard as 0/1): accept known codes only.
+            encoded = array.astype(np.float64)
+            unknown = ~np.isin(encoded, table['codes'])
+            if unknown.any():
+                bad = ', '.join(map(str, np.unique(array[unknown])[:5]))
+                raise EncodingError(f"Valeurs inconnues pour la colonne '{name}' : {bad}")
+            return encoded
+
+        # Hash the column down to its few distinct labels, resolve those against the
+        # sorted lookup keys, then broadcast back through the factorized codes.
+        codes, uniques = pd.factorize(array, use_na_sentinel=False)
+        uniques = np.asarray(uniques).astype(str)
+        keys = table['keys']
+        position = np.minimum(np.searchsorted(keys, uniques), len(keys) - 1)
+        unknown = keys[position] != uniques
+        if unknown.any():
+            bad = ', '.join(uniques[unknown][:5])
+            raise EncodingError(f"Valeurs inconnues pour la colonne '{name}' : {bad}")
+        return table['values'][position][codes]
+
+    def _encode_numeric(self, name, values):
+        bounds = self.numeric[name]
+        try:
+            encoded = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError) as e:
+            raise EncodingError(f"Valeurs non numériques dans la colonne '{name}' : {e}") from e
+        if np.isnan(encoded).any():
+            raise EncodingError(f"Valeurs manquantes dans la colonne '{name}'.")
+        out_of_range = (encoded < bounds['min']) | (encoded > bounds['max'])
+        if out_of_range.any():
+            raise EncodingError(
+                f"{int(out_of_range.sum())} valeur(s) hors limites pour la colonne '{name}' "
+                f"(attendu entre {bounds['min']:g} et {bounds['max']:g})."
+            )
+        return encoded
+
+    def encode_columns(self, data):
+        """
+        Encode a column mapping (DataFrame, dict of arrays) into a C-contiguous float64
+        matrix in model column order.
+        """
+        missing = [name for name in self.columns if name not in data]
+        if missing:
+            raise EncodingError(f"Colonnes manquantes dans les données d'entrée : {', '.join(missing)}")
+        n_rows = len(data[self.columns[0]])
+        X = np.empty((n_rows, len(self.columns)), dtype=np.float64)
+        for j, name in enumerate(self.columns):
+            if name in self.categorical:
+                X[:, j] = self._encode_categorical(name, data[name])
+            else:
+                X[:, j] = self._encode_numeric(name, data[name])
+        return X
+
+    def encode_records(self, records):
+        """Encode a list of dicts (e.g. parsed JSON clients)."""
+        return self.encode_columns({name: [record.get(name) for record in records] for name in self.columns})
+
+    def encode_row(self, **values):
+        """Encode a single client given as keyword arguments; returns a (1, n_features) matrix."""
+        return self.encode_columns({name: [values.get(name)] for name in self.columns})
+
+    # --- Spec Accessors ---
+    def options(self, name):
+        """Display labels of a categorical column, in spec order."""
+        return self.categorical[name]['options']
+
+    def bounds(self, name):
+        """(min, max, default) of a numeric column as written in the spec; unbounded limits are None."""
+        column = self.spec_column(name)
+        return column.get('min'), column.get('max'), column.get('default')
+
+    def value_labels(self):
+        """Encoded value -> display label for every categorical column."""
+        return {name: table['labels'] for name, table in self.categorical.items()}
+
+    def sweep_domains(self):
+        """Values explored by the what-if panel: sweep grid for numeric, every code for categorical."""
+        domains = {}
+        for name in self.columns:
+            if name in self.categorical:
+                domains[name] = np.array([float(self.spec_column(name)['categories'][label])
+                                          for label in self.options(name)])
+            else:
+                sweep = self.numeric[name]['sweep']
+                if 'num' in sweep:
+                    domains[name] = np.linspace(sweep['start'], sweep['stop'], sweep['num'])
+                else:
+                    domains[name] = np.arange(sweep['start'], sweep['stop'] + sweep['step'], sweep['step'], dtype=np.float64)
+        return domains
+
+    def spec_column(self, name):
+        return self.spec['columns'][self.columns.index(name)]
+
+
+def load_encoder(path=DEFAULT_SPEC_PATH):
+    """Read and compile an encoder spec file."""
+    with open(path, encoding='utf-8') as file:
+        return FeatureEncoder(json.load(file))
@@ -0,0 +1,159 @@
+"""
+Background execution of chatbot requests.
+
+Transcription and chat completion run on a process-wide thread pool instead of the
+Streamlit script thread, so a session's page stays responsive while its answer is
+produced and the script thread is released between polls. Each session holds at most
+one Job handle: the page polls it, renders its partial text, and cancels it when the
+history is cleared.
+
+The pool size is the limit on concurrent upstream requests; beyond it jobs queue, and
+once CHAT_MAX_PENDING jobs are queued or running new submissions are refused rather
+than piling up on the API.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+from llm_client import RequestCancelled
+
+CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', '4'))
+CHAT_MAX_PENDING = int(os.environ.get('CHAT_MAX_PENDING', '32'))
+JOB_POLL_SECONDS = float(os.environ.get('CHAT_JOB_POLL_SECONDS', '0.3'))
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already queued or running."""
+
+
+# --- Job Handle ---
+class Job:
+    """
+    Handle on one background request. The worker writes `status`, `partial` and
+    `user_text` as it progresses; the page only reads them.
+    """
+
+    def __init__(self, kind, meta=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = "En attente…"
+        self.state = 'queued'  # queued, running, done, failed, cancelled
+        self.user_text = None
+        self.partial = ''
+        self.result = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Stop the job at its next checkpoint; a job still queued never starts."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self.state = 'cancelled'
+
+    def check(self):
+        """Checkpoint called by the worker between steps and on every streamed token."""
+        if self._cancel.is_set():
+            raise RequestCancelled()
+
+    def update(self, status):
+        self.check()
+        self.status = status
+
+    def stream_text(self, text):
+        """`on_text` callback for chat_reply."""
+        self.check()
+        self.partial = text
+
+    @property
+    def queue_ms(self):
+        return ((self.started_at or time.perf_counter()) - self.submitted_at) * 1000
+
+
+# --- Runner ---
+class JobRunner:
+    """Bounded thread pool shared by every session of the process."""
+
+    def __init__(self, max_workers=CHAT_MAX_CONCURRENCY, max_pending=CHAT_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chat-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.counts = {'submitted': 0, 'rejected': 0, 'running': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, fn, kind='chat', **meta):
+        """
+        Run `fn(job)` in the background; its return value becomes `job.result`.
+        `meta` is kept on the handle for the page (e.g. the id of a recorded clip).
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise JobQueueFull("Le service est très sollicité, veuillez réessayer dans quelques instants.")
+        job = Job(kind, meta)
+        self._count('submitted')
+        job.future = self._pool.submit(self._run, job, fn)
+        job.future.add_done_callback(lambda future: self._finished(job, future))
+        return job
+
+    def _finished(self, job, future):
+        # Runs on completion and on cancellation before start alike.
+        if future.cancelled():
+            self._count('cancelled')
+            telemetry.increment('jobs', kind=job.kind, state='cancelled')
+        self._slots.release()
+
+    def _run(self, job, fn):
+        job.started_at = time.perf_counter()
+        telemetry.observe('job_queue_seconds', job.queue_ms / 1000, kind=job.kind)
+        self._count('running')
+        try:
+            job.check()
+            job.state = 'running'
+            job.result = fn(job)
+            job.state = 'done'
+        except RequestCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            job.error = e
+            job.state = 'failed'
+        finally:
+            job.finished_at = time.perf_counter()
+            self._count('running', -1)
+            self._count(job.state)
+            telemetry.increment('jobs', kind=job.kind, state=job.state)
+
+    def _count(self, name, step=1):
+        with self._lock:
+            self.counts[name] += step
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, workers=self.max_workers, max_pending=self.max_pending)
+
+
+_lock = threading.Lock()
+_runner = {'runner': None}
+
+
+def get_runner():
+    """Process-wide runner, created on first use."""
+    with _lock:
+        if _runner['runner'] is None:
+            _runner['runner'] = JobRunner()
+        return _runner['runner']
@@ -0,0 +1,204 @@
+"""
+Process-wide Groq client for the chatbot.
+
+Streamlit re-executes app.py on every rerun but keeps imported modules, so the client
+held here (and its HTTP connection pool and TLS sessions) is shared by every session
+and rerun of the process. A new client is built only when the settings change, for
+instance when GROQ_API_KEY is rotated in the secrets.
+"""
+import json
+import os
+import threading
+import time
+
+import httpx
+
+import telemetry
+
+DEFAULT_SETTINGS = {
+    'GROQ_TIMEOUT': 30.0,       # secondes par requête
+    'GROQ_CONNECT_TIMEOUT': 5.0,
+    'GROQ_MAX_RETRIES': 2,      # nouvelles tentatives avec backoff exponentiel (géré par le SDK)
+    'GROQ_POOL_SIZE': 10,       # connexions keep-alive conservées
+    'GROQ_BASE_URL': None,      # ex. http://127.0.0.1:8080 pour un serveur local de test
+    'CHAT_BACKEND': 'groq',     # 'mock' : client local déterministe (voir mock_backend.py)
+}
+
+_lock = threading.Lock()
+_current = {'settings': None, 'client': None}
+
+
+# Failures of an accepted stream while it is being read (dropped connection, truncated or
+# garbled events): only these are replayed without streaming. Errors returned by the API
+# (authentication, rate limit, other HTTP statuses) and timeouts are raised unchanged, the
+# SDK having already applied its retries.
+STREAM_FAILURES = (httpx.TransportError, httpx.DecodingError, json.JSONDecodeError)
+
+
+class RequestCancelled(Exception):
+    """Raised from an `on_text` callback to abort a reply; never triggers the non-streaming retry."""
+
+
+def client_settings(source=None):
+    """
+    Resolve the client settings from a mapping (e.g. st.secrets), then the environment,
+    then the defaults.
+    """
+    source = source or {}
+    settings = {}
+    for name, default in DEFAULT_SETTINGS.items():
+        value = source.get(name) if name in source else os.environ.get(name, default)
+        if value is not None and default is not None:
+            value = type(default)(value)
+        settings[name] = value
+    return settings
+
+
+def build_client(api_key, settings):
+    """
+    Create a Groq client with explicit timeouts, retries and a keep-alive pool, or the
+    local stand-in when CHAT_BACKEND is 'mock'. Both expose the same
+    chat.completions.create / audio.transcriptions.create surface.
+    """
+    if settings.get('CHAT_BACKEND') == 'mock':
+        from mock_backend import MockLLMClient
+        return MockLLMClient()
+    from groq import Groq
+
+    timeout = httpx.Timeout(settings['GROQ_TIMEOUT'], connect=settings['GROQ_CONNECT_TIMEOUT'])
+    http_client = httpx.Client(
+        timeout=timeout,
+        limits=httpx.Limits(max_keepalive_connections=settings['GROQ_POOL_SIZE'],
+                            max_connections=settings['GROQ_POOL_SIZE'] * 2),
+    )
+    return Groq(api_key=api_key, base_url=settings['GROQ_BASE_URL'], timeout=timeout,
+                max_retries=settings['GROQ_MAX_RETRIES'], http_client=http_client)
+
+
+def get_client(api_key, settings=None):
+    """Return the shared client, rebuilding it if the key or settings changed."""
+    settings = settings or client_settings()
+    wanted = (api_key, tuple(sorted(settings.items())))
+    with _lock:
+        if _current['settings'] != wanted:
+            # The previous client is not closed here: other sessions may still have a
+            # request in flight on it. Its pool is released once it is garbage-collected.
+            _current['client'] = build_client(api_key, settings)
+            _current['settings'] = wanted
+        return _current['client']
+
+
+def reset_client():
+    """
+    Drop the shared client, e.g. after an authentication error, so the next call rebuilds
+    it. As in get_client, it is not closed: other sessions may still be reading from it.
+    """
+    with _lock:
+        _current['settings'] = None
+        _current['client'] = None
+
+
+# --- Chat Completions ---
+CHAT_MODEL = os.environ.get('CHAT_MODEL', 'llama3-70b-8192')
+CHAT_STREAMING = os.environ.get('CHAT_STREAMING', '1') not in ('0', 'false', 'False')
+MAX_TOOL_ROUNDS = int(os.environ.get('CHAT_MAX_TOOL_ROUNDS', '2'))
+
+
+def chat_reply(client, messages, model=CHAT_MODEL, stream=CHAT_STREAMING, on_text=None,
+               tools=None, run_tool=None, max_tool_rounds=MAX_TOOL_ROUNDS):
+    """
+    Get the assistant's answer, streaming tokens to `on_text(text_so_far)` as they arrive.
+    If the stream breaks while it is read (see STREAM_FAILURES), the request is replayed
+    once without streaming and the full answer is passed to `on_text`.
+
+    With `tools`, the model may request calls: each is run with `run_tool(name, arguments)`
+    (arguments as a JSON string, result as a string) and the results are sent back, for
+    at most `max_tool_rounds` rounds. Returns (text, timing) where timing holds
+    time-to-first-token, total duration (ms), whether the answer was streamed, and the
+    number and duration of tool calls.
+    """
+    start = time.perf_counter()
+    messages = list(messages)
+    first_token_at = None
+    tool_calls = 0
+    tool_seconds = 0.0
+    for tool_round in range(max_tool_rounds + 1):
+        offered = tools if tools and tool_round < max_tool_rounds else None
+        text, calls, token_at, streamed = _complete(client, messages, model, stream, on_text, offered)
+        first_token_at = first_token_at or token_at
+        if not calls:
+            break
+        messages.append({"role": "assistant", "content": text or None, "tool_calls": [
+            {"id": call['id'], "type": "function",
+             "function": {"name": call['name'], "arguments": call['arguments']}} for call in calls
+        ]})
+        for call in calls:
+            tool_start = time.perf_counter()
+            result = run_tool(call['name'], call['arguments'])
+            tool_seconds += time.perf_counter() - tool_start
+            tool_calls += 1
+            messages.append({"role": "tool", "tool_call_id": call['id'], "content": result})
+    timing = _timing(start, first_token_at, streamed)
+    timing.update(tool_calls=tool_calls, tool_ms=tool_seconds * 1000)
+    mode = 'stream' if streamed else 'full'
+    telemetry.observe('chat_completion_seconds', timing['total_ms'] / 1000, mode=mode)
+    telemetry.observe('chat_ttft_seconds', timing['ttft_ms'] / 1000, mode=mode)
+    if tool_calls:
+        telemetry.increment('chat_tool_calls', tool_calls)
+    return text, timing
+
+
+def _complete(client, messages, model, stream, on_text, tools):
+    """One completion; returns (text, tool calls, first token time, streamed)."""
+    request = dict(messages=messages, model=model)
+    if tools:
+        request.update(tools=tools, tool_choice='auto')
+    first_token_at = None
+    if stream:
+        parts = []
+        calls = {}
+        response = client.chat.completions.create(stream=True, **request)
+        try:
+            for chunk in response:
+                delta = chunk.choices[0].delta if chunk.choices else None
+                if delta is None:
+                    continue
+                # Tool calls arrive as fragments keyed by index: id and name first, then argument pieces.
+                for fragment in delta.tool_calls or []:
+                    call = calls.setdefault(fragment.index, {'id': None, 'name': '', 'arguments': ''})
+                    call['id'] = fragment.id or call['id']
+                    if fragment.function is not None:
+                        call['name'] += fragment.function.name or ''
+                        call['arguments'] += fragment.function.arguments or ''
+                if not delta.content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(delta.content)
+                if on_text is not None:
+                    on_text(''.join(parts))
+            return ''.join(parts), [calls[index] for index in sorted(calls)], first_token_at, True
+        except httpx.TimeoutException:
+            raise
+        except STREAM_FAILURES:
+            telemetry.increment('chat_stream_fallbacks')
+            first_token_at = None # Repli non streamé ci-dessous
+
+    message = client.chat.completions.create(**request).choices[0].message
+    calls = [{'id': call.id, 'name': call.function.name, 'arguments': call.function.arguments}
+             for call in message.tool_calls or []]
+    text = message.content or ''
+    if text:
+        first_token_at = time.perf_counter()
+        if on_text is not None:
+            on_text(text)
+    return text, calls, first_token_at, False
+
+
+def _timing(start, first_token_at, streamed):
+    end = time.perf_counter()
+    return {
+        'ttft_ms': ((first_token_at or end) - start) * 1000,
+        'total_ms': (end - start) * 1000,
+        'streamed': streamed,
+    }
@@ -0,0 +1,176 @@
+"""
+Deterministic local stand-in for the Groq client.
+
+Selected with CHAT_BACKEND=mock (environment or secrets). It answers
+`client.chat.completions.create` (streamed or not, with tool calls) and
+`client.audio.transcriptions.create` without any network access, with configurable
+latency and failure injection, so the chatbot can be benchmarked and regression-tested
+offline. Answers depend only on the request content and MOCK_LLM_SEED.
+
+Settings (environment):
+    MOCK_LLM_TTFT_MS          delay before the first token (default 150)
+    MOCK_LLM_TOKEN_MS         delay between streamed tokens (default 15)
+    MOCK_LLM_ANSWER_TOKENS    length of generated answers (default 40)
+    MOCK_TRANSCRIPTION_MS     transcription delay (default 300)
+    MOCK_TRANSCRIPT           text returned by every transcription
+    MOCK_FAILURE_RATE         probability of an injected failure per call (default 0)
+    MOCK_FAILURE_MODE         error (HTTP 503), timeout, or stream_break (stream fails mid-answer)
+    MOCK_LLM_SEED             seed of the failure draws and answer wording (default 0)
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+
+MOCK_SETTINGS = {
+    'MOCK_LLM_TTFT_MS': 150.0,
+    'MOCK_LLM_TOKEN_MS': 15.0,
+    'MOCK_LLM_ANSWER_TOKENS': 40,
+    'MOCK_TRANSCRIPTION_MS': 300.0,
+    'MOCK_TRANSCRIPT': "Quel est le risque pour un client de 45 ans en Allemagne avec 2 produits ?",
+    'MOCK_FAILURE_RATE': 0.0,
+    'MOCK_FAILURE_MODE': 'error',
+    'MOCK_LLM_SEED': 0,
+}
+
+_WORDS = ("le client présente un profil à surveiller ; proposez un entretien de fidélisation, "
+          "une offre adaptée à ses produits et un suivi de son activité dans les prochains mois").split()
+_GEOGRAPHY = {'allemagne': 'Allemagne', 'germany': 'Allemagne', 'france': 'France', 'espagne': 'Espagne', 'spain': 'Espagne'}
+
+
+class MockBackendError(Exception):
+    """Injected upstream failure; carries an HTTP-like status code like the SDK errors."""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def mock_settings(source=None):
+    """Resolve the mock settings from a mapping, then the environment, then the defaults."""
+    source = source or {}
+    return {name: type(default)(source[name] if name in source else os.environ.get(name, default))
+            for name, default in MOCK_SETTINGS.items()}
+
+
+def extract_clients(text):
+    """Clients described in a question, as score_clients tool arguments (age, country, products)."""
+    lowered = text.lower()
+    client = {}
+    age = re.search(r"(\d{2})\s*ans", lowered)
+    if age:
+        client['Age'] = int(age.group(1))
+    for word, country in _GEOGRAPHY.items():
+        if word in lowered:
+            client['Geography'] = country
+            break
+    products = re.search(r"(\d)\s*produits?", lowered)
+    if products:
+        client['NumOfProducts'] = int(products.group(1))
+    return [client] if client else []
+
+
+# --- Client ---
+class MockLLMClient:
+    """Object with the `chat.completions.create` / `audio.transcriptions.create` surface of Groq."""
+
+    def __init__(self, settings=None):
+        self.settings = mock_settings(settings)
+        self._random = random.Random(self.settings['MOCK_LLM_SEED'])
+        self._lock = threading.Lock()
+        self.calls = {'chat': 0, 'transcription': 0, 'failures': 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def close(self):
+        pass
+
+    # --- Failure Injection ---
+    def _draw_failure(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+            failed = self._random.random() < self.settings['MOCK_FAILURE_RATE']
+            if failed:
+                self.calls['failures'] += 1
+        return self.settings['MOCK_FAILURE_MODE'] if failed else None
+
+    def _fail(self, mode):
+        if mode == 'timeout':
+            time.sleep(self.settings['MOCK_LLM_TTFT_MS'] / 1000)
+            raise MockBackendError("Délai d'attente dépassé (simulation).", status_code=408)
+        raise MockBackendError("Service indisponible (simulation).")
+
+    # --- Chat ---
+    def _answer(self, messages):
+        last = messages[-1]
+        content = last.get('content') or ''
+        digest = int(hashlib.sha256(f"{self.settings['MOCK_LLM_SEED']}:{content}".encode()).hexdigest(), 16)
+        if last.get('role') == 'tool':
+            result = json.loads(content)
+            probabilities = [f"{client['churn_probability']:.0%}" for client in result.get('clients', [])]
+            lead = f"Probabilité de désabonnement estimée : {', '.join(probabilities) or 'indisponible'}."
+        else:
+            lead = f"Réponse simulée ({digest % 1000:03d})."
+        words = [_WORDS[(digest + i) % len(_WORDS)] for i in range(self.settings['MOCK_LLM_ANSWER_TOKENS'])]
+        return f"{lead} {' '.join(words)}"
+
+    def _tool_calls(self, messages, tools):
+        last = messages[-1]
+        if not tools or last.get('role') != 'user':
+            return []
+        clients = extract_clients(last.get('content') or '')
+        if not clients:
+            return []
+        return [{'id': 'call_mock_0', 'name': tools[0]['function']['name'],
+                 'arguments': json.dumps({'clients': clients})}]
+
+    def _chat(self, messages, model, stream=False, tools=None, **_):
+        failure = self._draw_failure('chat')
+        if failure == 'stream_break' and not stream:
+            failure = None # Seuls les appels streamés peuvent être interrompus en cours de route
+        if failure and failure != 'stream_break':
+            self._fail(failure)
+        calls = self._tool_calls(messages, tools)
+        text = '' if calls else self._answer(messages)
+        if stream:
+            return self._stream(model, text, calls, failure == 'stream_break')
+        time.sleep((self.settings['MOCK_LLM_TTFT_MS']
+                    + self.settings['MOCK_LLM_TOKEN_MS'] * len(text.split())) / 1000)
+        tool_calls = [SimpleNamespace(id=call['id'], type='function',
+                                      function=SimpleNamespace(name=call['name'], arguments=call['arguments']))
+                      for call in calls] or None
+        message = SimpleNamespace(role='assistant', content=text or None, tool_calls=tool_calls)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')])
+
+    def _stream(self, model, text, calls, break_midway):
+        time.sleep(self.settings['MOCK_LLM_TTFT_MS'] / 1000)
+        for index, call in enumerate(calls):
+            function = SimpleNamespace(name=call['name'], arguments=call['arguments'])
+            fragment = SimpleNamespace(index=index, id=call['id'], type='function', function=function)
+            yield _chunk(model, SimpleNamespace(content=None, tool_calls=[fragment]))
+        tokens = text.split()
+        for position, token in enumerate(tokens):
+            if break_midway and position == len(tokens) // 2:
+                # What httpx raises when the server drops a streamed response midway.
+                raise httpx.RemoteProtocolError("Flux interrompu (simulation).")
+            if position:
+                time.sleep(self.settings['MOCK_LLM_TOKEN_MS'] / 1000)
+            yield _chunk(model, SimpleNamespace(content=token + ' ', tool_calls=None))
+
+    # --- Transcription ---
+    def _transcribe(self, file, model, **_):
+        failure = self._draw_failure('transcription')
+        time.sleep(self.settings['MOCK_TRANSCRIPTION_MS'] / 1000)
+        if failure:
+            self._fail(failure)
+        return SimpleNamespace(text=self.settings['MOCK_TRANSCRIPT'])
+
+
+def _chunk(model, delta):
+    return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
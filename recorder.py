@@ -0,0 +1,148 @@
+"""
+In-browser audio recorder component of the chatbot page.
+
+The recorder's HTML/JS is formatted once, when this module is first imported, instead
+of on every rerun of app.py; rendering it only hands the prebuilt string to Streamlit.
+"""
+import streamlit as st
+
+# Component name used in JavaScript's postMessage, and session_state key of the recording
+COMPONENT_NAME = "audio_recorder_custom_component"
+
+RECORDER_HTML = f"""
+<style>
+.audio-recorder-container {{
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    justify-content: center;
+    padding: 10px;
+    border-radius: 8px;
+    background-color: #262730;
+    margin-top: 10px;
+}}
+.audio-recorder-button {{
+    background-color: #FF4B4B;
+    color: white;
+    border: none;
+    border-radius: 50%;
+    width: 45px;
+    height: 45px;
+    font-size: 18px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    cursor: pointer;
+    transition: background-color 0.3s ease, transform 0.1s ease;
+    box-shadow: 0 2px 5px rgba(0, 0, 0, 0.2);
+}}
+.audio-recorder-button:hover {{
+    background-color: #E63B3B;
+    transform: scale(1.05);
+}}
+.audio-recorder-button:active {{
+    transform: scale(0.95);
+}}
+.audio-recorder-button.recording {{
+    background-color: #28a745;
+    animation: pulse 1.5s infinite;
+}}
+.audio-recorder-status {{
+    margin-top: 8px;
+    font-size: 0.8em;
+    color: #ccc;
+}}
+@keyframes pulse {{
+    0% {{ box-shadow: 0 0 0 0 rgba(40, 167, 69, 0.7); }}
+    70% {{ box-shadow: 0 0 0 10px rgba(40, 167, 69, 0); }}
+    100% {{ box-shadow: 0 0 0 0 rgba(40, 167, 69, 0); }}
+}}
+</style>
+<div class="audio-recorder-container">
+    <button id="recordButton" class="audio-recorder-button">🎤</button>
+    <div id="status" class="audio-recorder-status">Appuyez pour enregistrer</div>
+</div>
+
+<script>
+    const recordButton = document.getElementById('recordButton');
+    const statusDiv = document.getElementById('status');
+    let mediaRecorder;
+    let audioChunks = [];
+    let isRecording = false;
+
+    function sendAudioToStreamlit(data) {{ // Doubled {{
+        if (window.parent.streamlitReportReady) {{ // Doubled {{
+            window.parent.streamlitReportReady();
+        }} // Doubled }}
+        console.log("Sending data to Streamlit. Data length:", data ? data.length : 0); // DEBUG JS
+        window.parent.postMessage({{ // Doubled {{
+            type: 'streamlit:setComponentValue',
+            componentName: '{COMPONENT_NAME}',
+            value: data,
+        }}, '*'); // Doubled }}
+    }} // Doubled }}
+
+    recordButton.onclick = async () => {{ // Doubled {{
+        if (!isRecording) {{ // Doubled {{
+            isRecording = true;
+            recordButton.classList.add('recording');
+            recordButton.innerHTML = '🛑';
+            statusDiv.innerText = 'Enregistrement... Appuyez pour arrêter.';
+            audioChunks = [];
+
+            try {{ // Doubled {{
+                const stream = await navigator.mediaDevices.getUserMedia({{ audio: true }}); // Doubled {{
+                // Ensure audio/webm is supported, fallback if needed
+                const mimeType = MediaRecorder.isTypeSupported('audio/webm') ? 'audio/webm' :
+                               MediaRecorder.isTypeSupported('audio/mp4') ? 'audio/mp4' :
+                               'audio/ogg'; // Fallback to a common type
+
+                console.log("Using MIME type for recording:", mimeType); // DEBUG JS
+                mediaRecorder = new MediaRecorder(stream, {{ mimeType: mimeType }}); // Doubled {{
+
+                mediaRecorder.ondataavailable = event => {{ // Doubled {{
+                    audioChunks.push(event.data);
+                }}; // Doubled }}
+
+                mediaRecorder.onstop = async () => {{ // Doubled {{
+                    const audioBlob = new Blob(audioChunks, {{ type: mimeType }}); // Doubled {{
+                    const reader = new FileReader();
+                    reader.readAsDataURL(audioBlob);
+                    reader.onloadend = () => {{ // Doubled {{
+                        const base64data = reader.result.split(',')[1];
+                        console.log("Audio recorded. Base64 length:", base64data ? base64data.length : 0); // DEBUG JS
+                        sendAudioToStreamlit(base64data);
+                    }}; // Doubled }}
+                    stream.getTracks().forEach(track => track.stop());
+                }}; // Doubled }}
+
+                mediaRecorder.start();
+            }} catch (err) {{ // Doubled {{
+                console.error('Error accessing microphone or media recording:', err); // DEBUG JS
+                statusDiv.innerText = 'Erreur: Accès micro refusé ou impossible. Vérifiez les permissions de votre navigateur.';
+                isRecording = false;
+                recordButton.classList.remove('recording');
+                recordButton.innerHTML = '🎤';
+            }} // Doubled }}
+
+        }} else {{ // Doubled {{
+            isRecording = false;
+            recordButton.classList.remove('recording');
+            recordButton.innerHTML = '🎤';
+            statusDiv.innerText = 'Appuyez pour enregistrer';
+            if (mediaRecorder && mediaRecorder.state === 'recording') {{ // Doubled {{
+                mediaRecorder.stop();
+            }} // Doubled }}
+        }} // Doubled }}
+    }}; // Doubled }}
+</script>
+"""
+
+
+def audio_recorder_component():
+    """
+    Streamlit component to record audio in the browser and return it as base64.
+    """
+    st.components.v1.html(RECORDER_HTML, height=100, scrolling=False)
+    # Return the value from session_state using the defined component name
+    return st.session_state.get(COMPONENT_NAME, None)
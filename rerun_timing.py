@@ -0,0 +1,87 @@
+"""
+Phase-by-phase timing of the Streamlit script runs.
+
+Streamlit re-executes app.py from the top on every interaction. app.py marks the end
+of each phase (imports, CSS, model loading, page rendering...) on a RunTimer; finished
+runs are kept in a short per-process history so the first (cold) run of the process
+can be compared with the following (warm) reruns. Runs cut short by st.rerun() are
+finished just before it, their last phase being named "rerun". Every finished run and phase is also
+recorded in the telemetry registry, so reruns show up in the exported percentiles.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import telemetry
+
+RERUN_TIMING_HISTORY = int(os.environ.get('RERUN_TIMING_HISTORY', '200'))
+RERUN_TIMING_ENABLED = os.environ.get('RERUN_TIMING', '0') not in ('0', 'false', 'False')
+
+_lock = threading.Lock()
+_runs = deque(maxlen=RERUN_TIMING_HISTORY)
+_started = {'runs': 0}
+
+
+class RunTimer:
+    """Timer of one script run; `mark(phase)` closes the phase that started at the previous mark."""
+
+    def __init__(self):
+        with _lock:
+            self.index = _started['runs']
+            _started['runs'] += 1
+        self.cold = self.index == 0
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.phases = []
+        self.report = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    def finish(self, last_phase=None):
+        """
+        Record the run in the process history and return its report; `last_phase` closes
+        the current phase first. Only the first call records, later ones return the same report.
+        """
+        if self.report is not None:
+            return self.report
+        if last_phase is not None:
+            self.mark(last_phase)
+        report = self.report = {
+            'run': self.index,
+            'cold': self.cold,
+            'total_ms': (time.perf_counter() - self.start) * 1000,
+            'phases': list(self.phases),
+        }
+        with _lock:
+            _runs.append(report)
+        start = 'cold' if self.cold else 'warm'
+        telemetry.observe('rerun_seconds', report['total_ms'] / 1000, start=start)
+        for phase, ms in self.phases:
+            telemetry.observe('rerun_phase_seconds', ms / 1000, phase=phase, start=start)
+        return report
+
+
+def history():
+    with _lock:
+        return list(_runs)
+
+
+def summary():
+    """Cold run report (if still in the history) and the mean of each phase over the warm runs."""
+    runs = history()
+    cold = next((run for run in runs if run['cold']), None)
+    warm = [run for run in runs if not run['cold']]
+    means = {}
+    for run in warm:
+        for phase, ms in run['phases']:
+            means.setdefault(phase, []).append(ms)
+    return {
+        'cold': cold,
+        'warm_runs': len(warm),
+        'warm_total_ms': sum(run['total_ms'] for run in warm) / len(warm) if warm else None,
+        'warm_phases_ms': {phase: sum(values) / len(values) for phase, values in means.items()},
+    }
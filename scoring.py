@@ -0,0 +1,257 @@
+"""
+Churn scoring helpers shared by the Streamlit app and the headless batch entry point.
+Nothing in this module imports Streamlit so it can be used from scripts and workers.
+"""
+import os
+import pickle
+import time
+
+import numpy as np
+
+import telemetry
+from encoder import load_encoder
+
+# --- Decision Threshold ---
+# A client is flagged as churning when P(churn) >= threshold. Override with CHURN_THRESHOLD.
+DEFAULT_THRESHOLD = float(os.environ.get('CHURN_THRESHOLD', '0.5'))
+
+# --- Model Input Layout ---
+# Column order, lookup tables and valid ranges come from encoder_spec.json (see encoder.py),
+# compiled once at import.
+ENCODER = load_encoder()
+FEATURE_COLUMNS = ENCODER.columns
+SWEEP_DOMAINS = ENCODER.sweep_domains()
+SWEEP_LABELS = ENCODER.value_labels()
+
+
+# --- Model Loading ---
+def load_model_file(path='model.pkl'):
+    """Unpickle the trained classifier from disk."""
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+# --- Compiled GaussianNB Scorer ---
+class CompiledGaussianNB:
+    """
+    NumPy-only GaussianNB inference. The per-class log-normalisation constants and
+    1/var terms are computed once, so scoring a contiguous float64 matrix is one
+    squared-difference matmul per class followed by a log-sum-exp normalisation.
+    """
+
+    def __init__(self, theta, var, class_prior, classes):
+        self.theta = np.ascontiguousarray(theta, dtype=np.float64)
+        self.inv_var = np.ascontiguousarray(1.0 / np.asarray(var, dtype=np.float64))
+        self.log_prior = np.log(np.asarray(class_prior, dtype=np.float64))
+        self.feature_log_norm = -0.5 * np.log(2.0 * np.pi * np.asarray(var, dtype=np.float64))
+        self.log_norm = self.log_prior + self.feature_log_norm.sum(axis=1)
+        self.classes = np.asarray(classes)
+        self.n_features = self.theta.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Extract the fitted arrays from a sklearn GaussianNB."""
+        return cls(model.theta_, model.var_, model.class_prior_, model.classes_)
+
+    def joint_log_likelihood(self, X):
+        """Unnormalised log P(c) + log P(x | c) for each row of X, shape (n, n_classes)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        jll = np.empty((X.shape[0], self.theta.shape[0]), dtype=np.float64)
+        for c in range(self.theta.shape[0]):
+            diff = X - self.theta[c]
+            diff *= diff
+            np.matmul(diff, self.inv_var[c], out=jll[:, c])
+        jll *= -0.5
+        jll += self.log_norm
+        return jll
+
+    def predict_proba(self, X):
+        """Class probabilities, equivalent to GaussianNB.predict_proba."""
+        jll = self.joint_log_likelihood(X)
+        jll -= jll.max(axis=1, keepdims=True)
+        np.exp(jll, out=jll)
+        jll /= jll.sum(axis=1, keepdims=True)
+        return jll
+
+    def score(self, X):
+        """Return (predicted classes, class probabilities) from a single pass."""
+        proba = self.predict_proba(X)
+        return self.classes[proba.argmax(axis=1)], proba
+
+    def explain(self, X):
+        """
+        Exact per-feature decomposition of the churn log-odds, from the same pass as P(churn).
+        Naive Bayes factorises P(x | c) over features, so for the two classes
+            log P(1|x)/P(0|x) = log P(1)/P(0) + sum_j [log P(x_j|1) - log P(x_j|0)]
+        Returns (P(churn), contributions of shape (n, n_features), prior log-odds).
+        """
+        if self.theta.shape[0] != 2:
+            raise ValueError("Les contributions par variable ne sont définies que pour un modèle binaire.")
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        diff = X - self.theta[1]
+        contributions = diff * diff * self.inv_var[1]
+        np.subtract(X, self.theta[0], out=diff)
+        diff *= diff
+        diff *= self.inv_var[0]
+        contributions -= diff
+        contributions *= -0.5
+        contributions += self.feature_log_norm[1] - self.feature_log_norm[0]
+        base = float(self.log_prior[1] - self.log_prior[0])
+        log_odds = contributions.sum(axis=1) + base
+        churn_proba = np.exp(-np.logaddexp(0.0, -log_odds))  # Sigmoid without overflow
+        return churn_proba, contributions, base
+
+
+def compile_model(model):
+    """Build the NumPy scorer for a fitted GaussianNB."""
+    return CompiledGaussianNB.from_sklearn(model)
+
+
+# --- Vectorized Preprocessing ---
+def encode_frame(df):
+    """
+    Encode a frame of raw client records into the float64 matrix expected by the model.
+    Unknown categories and out-of-range values raise EncodingError (a ValueError).
+    """
+    with telemetry.timed('preprocess_seconds', path='frame'):
+        return ENCODER.encode_columns(df)
+
+
+# --- Single Client Scoring ---
+def predict_client(scorer, X, threshold=DEFAULT_THRESHOLD, cache=None, explain=0):
+    """
+    Score one encoded client with a single probability call, or none on a cache hit.
+    With `explain`, P(churn) and the `explain` strongest drivers come from one
+    decomposition pass instead, which always runs (its score still fills the cache).
+    Returns the predicted class, P(churn), the confidence in the predicted class, the
+    scoring latency in milliseconds and, with `explain`, the drivers.
+    """
+    start = time.perf_counter()
+    drivers = None
+    if explain:
+        churn_proba, contributions, _ = scorer.explain(X)
+        churn_proba = float(churn_proba[0])
+        drivers = client_drivers(X, contributions, explain)
+        cached = False
+        if cache is not None:
+            cache.put(X[0], churn_proba)
+    else:
+        churn_proba = cache.get(X[0]) if cache is not None else None
+        cached = churn_proba is not None
+        if not cached:
+            churn_proba = float(scorer.predict_proba(X)[0, 1])
+            if cache is not None:
+                cache.put(X[0], churn_proba)
+        if cache is not None:
+            telemetry.increment('score_cache_lookups', result='hit' if cached else 'miss')
+    latency_ms = (time.perf_counter() - start) * 1000
+    telemetry.observe('score_seconds', latency_ms / 1000, path='explain' if explain else 'single')
+    prediction = int(churn_proba >= threshold)
+    result = {
+        "prediction": prediction,
+        "churn_probability": churn_proba,
+        "probability": churn_proba if prediction == 1 else 1.0 - churn_proba,
+        "threshold": threshold,
+        "latency_ms": latency_ms,
+        "cached": cached,
+    }
+    if drivers is not None:
+        result["drivers"] = drivers
+    return result
+
+
+# --- What-If Sweeps ---
+def build_sweep_grid(x, features, domains=SWEEP_DOMAINS):
+    """
+    Repeat the encoded client `x` over the cartesian product of the swept features' domains.
+    Returns the (n_points, n_features) grid and the flattened value of each swept feature.
+    """
+    mesh = np.meshgrid(*[domains[feature] for feature in features], indexing='ij')
+    axes = [values.ravel() for values in mesh]
+    grid = np.repeat(np.asarray(x, dtype=np.float64).reshape(1, -1), axes[0].size, axis=0)
+    for feature, values in zip(features, axes):
+        grid[:, FEATURE_COLUMNS.index(feature)] = values
+    return grid, axes
+
+
+def sweep_client(scorer, x, features, domains=SWEEP_DOMAINS):
+    """Score the whole what-if grid of one client in a single call; returns (axes, P(churn))."""
+    grid, axes = build_sweep_grid(x, features, domains)
+    return axes, scorer.predict_proba(grid)[:, 1]
+
+
+# --- Explanations ---
+def top_drivers(contributions, top=3):
+    """
+    Indices and contributions of the `top` features with the largest absolute effect on
+    each row's churn log-odds, strongest first. Positive values push towards churn.
+    """
+    top = min(top, contributions.shape[1])
+    order = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :top]
+    return order, np.take_along_axis(contributions, order, axis=1)
+
+
+def client_drivers(X, contributions, top=None):
+    """Drivers of the first row from its contributions, strongest first: [{feature, value, contribution}]."""
+    order, values = top_drivers(contributions, top or contributions.shape[1])
+    return [{"feature": FEATURE_COLUMNS[j], "value": float(X[0, j]), "contribution": float(c)}
+            for j, c in zip(order[0], values[0])]
+
+
+def explain_client(scorer, X, top=None):
+    """Drivers of one encoded client, strongest first: [{feature, value, contribution}]."""
+    _, contributions, _ = scorer.explain(X)
+    return client_drivers(X, contributions, top)
+
+
+def driver_columns(top):
+    """Output column names of the `top` drivers: ChurnDriver{i} and ChurnDriver{i}Impact."""
+    return [name for i in range(1, top + 1) for name in (f'ChurnDriver{i}', f'ChurnDriver{i}Impact')]
+
+
+def explain_matrix(scorer, X, top=3):
+    """
+    P(churn) plus the names and log-odds contributions of the top drivers of every row,
+    all from one vectorized pass (explanations bypass the score cache).
+    """
+    with telemetry.timed('score_seconds', path='explain'):
+        churn_proba, contributions, _ = scorer.explain(X)
+        order, values = top_drivers(contributions, top)
+    return churn_proba, np.asarray(FEATURE_COLUMNS, dtype=object)[order], values
+
+
+# --- Chunked Scoring ---
+def score_matrix(scorer, X, cache=None):
+    """P(churn) for every row of an encoded matrix; with a cache, only missed rows are scored."""
+    with telemetry.timed('score_seconds', path='matrix'):
+        if cache is None:
+            return scorer.predict_proba(X)[:, 1]
+        churn_proba, miss = cache.get_many(X)
+        misses = int(miss.sum())
+        telemetry.increment('score_cache_lookups', len(miss) - misses, result='hit')
+        telemetry.increment('score_cache_lookups', misses, result='miss')
+        if misses:
+            churn_proba[miss] = scorer.predict_proba(X[miss])[:, 1]
+            cache.put_many(X[miss], churn_proba[miss])
+        return churn_proba
+
+
+def score_chunks(scorer, chunks, threshold=DEFAULT_THRESHOLD, cache=None, explain=0):
+    """
+    Yield each raw chunk with ChurnPrediction and ChurnProbability columns appended.
+    With a cache, only the rows it does not already hold are sent to the scorer.
+    With `explain`, the names and log-odds impacts of that many top drivers are appended too.
+    """
+    for chunk in chunks:
+        X = encode_frame(chunk)
+        if explain:
+            churn_proba, names, impacts = explain_matrix(scorer, X, explain)
+        else:
+            churn_proba = score_matrix(scorer, X, cache)
+        scored = chunk.copy()
+        scored['ChurnPrediction'] = (churn_proba >= threshold).astype(np.int64)
+        scored['ChurnProbability'] = churn_proba
+        for i in range(names.shape[1] if explain else 0):
+            scored[f'ChurnDriver{i + 1}'] = names[:, i]
+            scored[f'ChurnDriver{i + 1}Impact'] = impacts[:, i]
+        yield scored
@@ -0,0 +1,244 @@
+"""
+Per-process performance telemetry shared by the Streamlit app, the API and the batch CLI.
+
+Code paths record durations with `timed(name)` / `observe(name, seconds)` and events
+with `increment(name)`; both take optional labels. Counters accumulate for the life of
+the process. Durations keep lifetime count and sum plus a rolling window of the most
+recent TELEMETRY_WINDOW samples, from which the p50/p95/p99 latencies are computed.
+
+The registry is exported as Prometheus text (`render_prometheus`, served by the API on
+/metrics and optionally written to TELEMETRY_PROM_FILE) and as one JSON object per
+export appended to TELEMETRY_JSON_LOG. Diagnostic messages go through the
+`clientinsight` logger, as JSON lines on stderr, filtered by LOG_LEVEL.
+
+Settings (environment):
+    TELEMETRY_WINDOW           samples kept per duration series (default 1024)
+    TELEMETRY_PROM_FILE        Prometheus text file rewritten on export (node_exporter textfile collector)
+    TELEMETRY_JSON_LOG         file receiving one JSON snapshot line per export
+    TELEMETRY_EXPORT_SECONDS   minimum interval between two file exports (default 15)
+    LOG_LEVEL                  level of the `clientinsight` logger (default WARNING)
+"""
+import contextlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+TELEMETRY_WINDOW = int(os.environ.get('TELEMETRY_WINDOW', '1024'))
+TELEMETRY_PROM_FILE = os.environ.get('TELEMETRY_PROM_FILE', '')
+TELEMETRY_JSON_LOG = os.environ.get('TELEMETRY_JSON_LOG', '')
+TELEMETRY_EXPORT_SECONDS = float(os.environ.get('TELEMETRY_EXPORT_SECONDS', '15'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING').upper()
+METRIC_PREFIX = 'clientinsight_'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# --- Series ---
+class Histogram:
+    """Lifetime count and sum of a duration, plus a rolling window of the latest samples."""
+
+    def __init__(self, window=TELEMETRY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def quantiles(self, quantiles=QUANTILES):
+        """Nearest-rank quantiles of the window; NaN while it is empty."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: math.nan for q in quantiles}
+        return {q: ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] for q in quantiles}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+# --- Registry ---
+class Registry:
+    """Thread-safe set of counters and duration histograms, keyed by name and labels."""
+
+    def __init__(self, window=TELEMETRY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self.started_at = time.time()
+
+    def describe(self, name, text):
+        """Set the HELP line of a metric."""
+        self._help[name] = text
+
+    def increment(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.window)
+            histogram.add(seconds)
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        """Observe the duration of the `with` block, whether it succeeds or raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- Export ---
+    def snapshot(self):
+        """Plain-data view of every series: counters, then durations with their percentiles in ms."""
+        with self._lock:
+            counters = [(name, dict(labels), value) for (name, labels), value in self._counters.items()]
+            histograms = [(name, dict(labels), h.count, h.total, len(h.samples), h.quantiles())
+                          for (name, labels), h in self._histograms.items()]
+        return {
+            'pid': os.getpid(),
+            'uptime_s': time.time() - self.started_at,
+            'counters': [{'name': name, 'labels': labels, 'value': value}
+                         for name, labels, value in sorted(counters, key=lambda c: (c[0], sorted(c[1].items())))],
+            'timers': [{
+                'name': name, 'labels': labels, 'count': count, 'sum_s': total, 'window': window,
+                **{f'p{round(q * 100)}_ms': quantiles[q] * 1000 for q in QUANTILES},
+            } for name, labels, count, total, window, quantiles in sorted(histograms, key=lambda h: (h[0], sorted(h[1].items())))],
+        }
+
+    def render_prometheus(self, prefix=METRIC_PREFIX):
+        """Prometheus text exposition: counters as `_total`, durations as summaries in seconds."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, h.count, h.total, h.quantiles()) for key, h in self._histograms.items())
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f'{prefix}{name}_total'
+            if metric not in declared:
+                declared.add(metric)
+                lines += [f"# HELP {metric} {self._help.get(name, name.replace('_', ' '))}", f"# TYPE {metric} counter"]
+            lines.append(f'{metric}{_label_text(labels)} {value}')
+        for (name, labels), count, total, quantiles in histograms:
+            metric = f'{prefix}{name}'
+            if metric not in declared:
+                declared.add(metric)
+                lines += [f"# HELP {metric} {self._help.get(name, name.replace('_', ' '))}", f"# TYPE {metric} summary"]
+            for q, value in quantiles.items():
+                lines.append(f'{metric}{_label_text(labels, [("quantile", q)])} {value:.6f}')
+            lines.append(f'{metric}_sum{_label_text(labels)} {total:.6f}')
+            lines.append(f'{metric}_count{_label_text(labels)} {count}')
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+REGISTRY = Registry()
+increment = REGISTRY.increment
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+describe = REGISTRY.describe
+snapshot = REGISTRY.snapshot
+render_prometheus = REGISTRY.render_prometheus
+
+for _name, _text in (
+    ('model_load_seconds', "Chargement de l'artefact du modèle."),
+    ('model_reloads', "Rechargements du modèle après publication d'une version, par résultat."),
+    ('preprocess_seconds', "Encodage des clients avant scoring."),
+    ('score_seconds', "Scoring d'un client ou d'un bloc de clients."),
+    ('batch_merge_seconds', "Fusion des tranches scorées en parallèle dans le fichier de sortie."),
+    ('score_cache_lookups', "Consultations du cache de scores, par résultat (hit/miss)."),
+    ('transcription_seconds', "Transcriptions audio envoyées à l'API."),
+    ('transcription_cache_lookups', "Consultations du cache de transcriptions, par résultat (hit/miss)."),
+    ('chat_completion_seconds', "Réponses complètes du chatbot, outils compris."),
+    ('chat_ttft_seconds', "Délai avant le premier jeton des réponses du chatbot."),
+    ('chat_stream_fallbacks', "Réponses rejouées sans streaming après la coupure du flux."),
+    ('chat_tool_calls', "Appels d'outils exécutés pendant les réponses du chatbot."),
+    ('job_queue_seconds', "Attente des tâches en arrière-plan avant leur démarrage."),
+    ('jobs', "Tâches en arrière-plan terminées, par état."),
+    ('rerun_seconds', "Exécutions du script Streamlit, à froid ou à chaud."),
+    ('rerun_phase_seconds', "Phases des exécutions du script Streamlit."),
+):
+    describe(_name, _text)
+
+
+# --- File Export ---
+_export = {'last': 0.0}
+_export_lock = threading.Lock()
+
+
+def export_files(force=False, registry=REGISTRY):
+    """
+    Rewrite TELEMETRY_PROM_FILE and append a snapshot to TELEMETRY_JSON_LOG, at most once
+    every TELEMETRY_EXPORT_SECONDS unless `force`. Returns True when something was written.
+    """
+    if not (TELEMETRY_PROM_FILE or TELEMETRY_JSON_LOG):
+        return False
+    with _export_lock:
+        now = time.monotonic()
+        if not force and now - _export['last'] < TELEMETRY_EXPORT_SECONDS:
+            return False
+        _export['last'] = now
+    if TELEMETRY_PROM_FILE:
+        temporary = f"{TELEMETRY_PROM_FILE}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(registry.render_prometheus())
+        os.replace(temporary, TELEMETRY_PROM_FILE)  # Scrapers never see a half-written file
+    if TELEMETRY_JSON_LOG:
+        with open(TELEMETRY_JSON_LOG, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(dict(registry.snapshot(), ts=time.time()), default=str) + "\n")
+    return True
+
+
+# --- Logging ---
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed with `extra={'fields': {...}}` are merged in."""
+
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def get_logger(name='clientinsight'):
+    """Logger writing JSON lines to stderr at LOG_LEVEL; configured once per process."""
+    logger = logging.getLogger(name)
+    root = logging.getLogger('clientinsight')
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.WARNING))
+        root.propagate = False
+    return logger
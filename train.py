@@ -0,0 +1,225 @@
+"""
+Incremental retraining of the churn model from new labelled data.
+
+New clients are streamed in chunks through GaussianNB.partial_fit, starting from the
+active model, so the full history never has to be loaded. A sample of each chunk is
+held out to compare the candidate with the active model; the candidate is published
+only if it does not lose more than --max-auc-drop of ROC AUC. Publishing writes the
+next numbered artifact in MODEL_DIR and atomically repoints MODEL_DIR/CURRENT, which
+running app and API workers pick up without a restart.
+
+    python train.py update new_clients.csv --target Exited
+    python train.py status
+    python train.py rollback            # previous version
+    python train.py rollback --to 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from artifact import (MODEL_DIR, ArtifactError, activate_version, compile_model, current_version,
+                      default_model_path, list_versions, publish_artifact, read_artifact, read_pointer,
+                      version_path)
+from batch import DEFAULT_CHUNK_SIZE, detect_format, iter_input_chunks
+from scoring import DEFAULT_THRESHOLD, encode_frame, load_model_file
+
+DEFAULT_TARGET = 'Exited'
+DEFAULT_HOLDOUT = 0.2
+DEFAULT_HOLDOUT_ROWS = 200_000
+
+
+# --- Base Model ---
+def load_trainable_model(path):
+    """
+    A sklearn GaussianNB that partial_fit can continue from: unpickled, or rebuilt from
+    an artifact header that carries the class counts.
+    """
+    if not str(path).endswith('.npz'):
+        return load_model_file(path)
+    from sklearn.naive_bayes import GaussianNB
+
+    header, arrays = read_artifact(path)
+    if 'class_count' not in header:
+        raise ArtifactError(f"L'artefact '{path}' ne contient pas les effectifs de classes : "
+                            "repartez du pickle (--base model.pkl) ou de zéro (--from-scratch).")
+    model = GaussianNB(var_smoothing=header.get('var_smoothing', 1e-9))
+    model.theta_ = arrays['theta'].copy()
+    model.var_ = arrays['var'].copy()
+    model.class_prior_ = arrays['class_prior'].copy()
+    model.classes_ = arrays['classes'].copy()
+    model.epsilon_ = float(arrays['epsilon'][0])
+    model.class_count_ = np.asarray(header['class_count'], dtype=np.float64)
+    model.n_features_in_ = model.theta_.shape[1]
+    return model
+
+
+# --- Training ---
+def train_incremental(model, chunks, target=DEFAULT_TARGET, holdout=DEFAULT_HOLDOUT,
+                      holdout_rows=DEFAULT_HOLDOUT_ROWS, seed=0, on_progress=None):
+    """
+    partial_fit `model` (None: a new GaussianNB) on every chunk, keeping a random
+    `holdout` fraction of the rows aside until `holdout_rows` are held out.
+    Returns (model, rows trained, holdout X, holdout y).
+    """
+    if model is None:
+        from sklearn.naive_bayes import GaussianNB
+        model = GaussianNB()
+    rng = np.random.default_rng(seed)
+    held_X, held_y = [], []
+    held = trained = 0
+    for chunk in chunks:
+        if target not in chunk.columns:
+            raise ValueError(f"Colonne cible '{target}' absente du fichier.")
+        X = encode_frame(chunk)
+        y = chunk[target].to_numpy(dtype=np.int64)
+        keep = rng.random(len(y)) < holdout if held < holdout_rows else np.zeros(len(y), dtype=bool)
+        keep &= np.cumsum(keep) <= holdout_rows - held
+        if keep.any():
+            held_X.append(X[keep])
+            held_y.append(y[keep])
+            held += int(keep.sum())
+        if (~keep).any():
+            model.partial_fit(X[~keep], y[~keep], classes=np.array([0, 1]))
+            trained += int((~keep).sum())
+        if on_progress is not None:
+            on_progress(trained, held)
+    if not trained:
+        raise ValueError("Aucune ligne d'entraînement : le fichier est vide ou entièrement mis de côté.")
+    if held_X:
+        return model, trained, np.concatenate(held_X), np.concatenate(held_y)
+    return model, trained, np.empty((0, model.theta_.shape[1])), np.empty(0, dtype=np.int64)
+
+
+def evaluate(scorer, X, y, threshold=DEFAULT_THRESHOLD):
+    """Holdout ROC AUC (None with a single class), log loss and accuracy of a compiled scorer."""
+    from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+
+    if not len(y):
+        return {'rows': 0}
+    churn_proba = scorer.predict_proba(X)[:, 1]
+    return {
+        'rows': int(len(y)),
+        'auc': float(roc_auc_score(y, churn_proba)) if len(np.unique(y)) == 2 else None,
+        'log_loss': float(log_loss(y, np.clip(churn_proba, 1e-15, 1 - 1e-15), labels=[0, 1])),
+        'accuracy': float(accuracy_score(y, churn_proba >= threshold)),
+    }
+
+
+def accept(candidate, baseline, max_auc_drop):
+    """Whether the candidate's holdout AUC is within `max_auc_drop` of the baseline's."""
+    if baseline is None or baseline.get('auc') is None:
+        return True
+    if candidate.get('auc') is None:
+        return False
+    return candidate['auc'] >= baseline['auc'] - max_auc_drop
+
+
+# --- Commands ---
+def command_update(args):
+    base_path = None if args.from_scratch else (args.base or read_pointer(args.model_dir) or default_model_path())
+    model = load_trainable_model(base_path) if base_path else None
+    baseline_scorer = compile_model(model) if model is not None else None
+
+    start = time.perf_counter()
+    chunks = iter_input_chunks(args.input, detect_format(args.input), args.chunk_size)
+    model, trained, X_holdout, y_holdout = train_incremental(
+        model, chunks, args.target, args.holdout, args.holdout_rows, args.seed,
+        on_progress=lambda done, held: print(f"\r{done} lignes apprises, {held} mises de côté", end='', file=sys.stderr))
+    print(file=sys.stderr)
+
+    candidate = evaluate(compile_model(model), X_holdout, y_holdout)
+    baseline = evaluate(baseline_scorer, X_holdout, y_holdout) if baseline_scorer is not None else None
+    print(f"Apprentissage : {trained} lignes en {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    print(f"Validation : candidat {json.dumps(candidate)} / actuel {json.dumps(baseline)}", file=sys.stderr)
+
+    if not accept(candidate, baseline, args.max_auc_drop) and not args.force:
+        print(f"Modèle rejeté : AUC en baisse de plus de {args.max_auc_drop} (--force pour publier quand même).", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        print("Validation réussie, rien n'est publié (--dry-run).", file=sys.stderr)
+        return 0
+    training = {
+        'parent': base_path,
+        'source': os.path.basename(str(args.input)),
+        'rows': trained,
+        'holdout': candidate,
+        'baseline_holdout': baseline,
+        'trained_at': time.time(),
+    }
+    version, path = publish_artifact(model, args.model_dir, training=training)
+    print(f"Version {version} publiée et activée : {path}", file=sys.stderr)
+    return 0
+
+
+def command_rollback(args):
+    versions = list_versions(args.model_dir)
+    current = current_version(args.model_dir)
+    if args.to is not None:
+        target = args.to
+    else:
+        older = [version for version in versions if current is None or version < current]
+        if not older:
+            print("Aucune version antérieure à réactiver.", file=sys.stderr)
+            return 1
+        target = older[-1]
+    if target not in versions:
+        print(f"Version {target} introuvable dans {args.model_dir} (disponibles : {versions}).", file=sys.stderr)
+        return 1
+    path = activate_version(target, args.model_dir)
+    print(f"Version {target} réactivée : {path}", file=sys.stderr)
+    return 0
+
+
+def command_status(args):
+    current = current_version(args.model_dir)
+    for version in list_versions(args.model_dir):
+        header, _ = read_artifact(version_path(version, args.model_dir))
+        training = header.get('training', {})
+        auc = (training.get('holdout') or {}).get('auc')
+        print(f"{'*' if version == current else ' '} v{version:04d}  {training.get('rows', '?'):>10} lignes  "
+              f"AUC {auc if auc is None else round(auc, 4)}  source {training.get('source', '?')}")
+    print(f"Modèle servi : {read_pointer(args.model_dir) or default_model_path()}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Réentraînement incrémental et versions du modèle.")
+    parser.add_argument('--model-dir', default=MODEL_DIR, help=f"Répertoire des versions (défaut : {MODEL_DIR})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    update = commands.add_parser('update', help="Apprendre sur un nouveau fichier étiqueté et publier une version")
+    update.add_argument('input', help="Fichier d'entrée (.csv ou .parquet) avec la colonne cible")
+    update.add_argument('--target', default=DEFAULT_TARGET, help=f"Colonne cible (défaut : {DEFAULT_TARGET})")
+    update.add_argument('--base', help="Modèle de départ (défaut : le modèle servi)")
+    update.add_argument('--from-scratch', action='store_true', help="Repartir d'un modèle vierge")
+    update.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    update.add_argument('--holdout', type=float, default=DEFAULT_HOLDOUT, help="Part des lignes mise de côté pour la validation")
+    update.add_argument('--holdout-rows', type=int, default=DEFAULT_HOLDOUT_ROWS, help="Nombre maximal de lignes de validation")
+    update.add_argument('--max-auc-drop', type=float, default=0.01, help="Baisse d'AUC tolérée face au modèle servi")
+    update.add_argument('--seed', type=int, default=0)
+    update.add_argument('--force', action='store_true', help="Publier même si la validation échoue")
+    update.add_argument('--dry-run', action='store_true', help="Valider sans publier")
+
+    rollback = commands.add_parser('rollback', help="Réactiver une version précédente")
+    rollback.add_argument('--to', type=int, help="Numéro de version (défaut : celle qui précède la version active)")
+
+    commands.add_parser('status', help="Lister les versions publiées")
+    args = parser.parse_args(argv)
+
+    if args.command == 'update':
+        if args.chunk_size <= 0:
+            parser.error("--chunk-size doit être strictement positif.")
+        if not 0.0 <= args.holdout < 1.0:
+            parser.error("--holdout doit être compris entre 0 et 1.")
+        return command_update(args)
+    if args.command == 'rollback':
+        return command_rollback(args)
+    return command_status(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+In-memory audio transcription shared by the recorded and uploaded audio paths.
+
+The audio is handed to the transcription API straight from memory: the decoded bytes
+of a recording, or the uploaded file object itself. Size and (when the container
+allows it) duration limits are enforced before any network call. A temporary file is
+only written when TRANSCRIPTION_IN_MEMORY is turned off, for clients that cannot
+upload from memory, and it is always removed.
+Transcripts can be cached by content hash, so re-sent audio does not hit the API again.
+"""
+import base64
+import binascii
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import wave
+
+import telemetry
+from cache import LRUCache
+
+TRANSCRIPTION_MODEL = os.environ.get('TRANSCRIPTION_MODEL', 'whisper-large-v3')
+TRANSCRIPTION_LANGUAGE = os.environ.get('TRANSCRIPTION_LANGUAGE', 'fr')
+MAX_AUDIO_BYTES = int(os.environ.get('MAX_AUDIO_BYTES', str(25 * 1024 * 1024)))
+MAX_AUDIO_SECONDS = float(os.environ.get('MAX_AUDIO_SECONDS', '600'))
+TRANSCRIPTION_CACHE_ENTRIES = int(os.environ.get('TRANSCRIPTION_CACHE_ENTRIES', '1000'))
+TRANSCRIPTION_CACHE_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_BYTES', str(4 * 1024 * 1024)))
+TRANSCRIPTION_IN_MEMORY = os.environ.get('TRANSCRIPTION_IN_MEMORY', '1').lower() not in ('0', 'false', 'no')
+
+logger = telemetry.get_logger('clientinsight.transcription')
+
+
+class AudioRejected(ValueError):
+    """Raised when an audio payload is empty, too large or too long."""
+
+
+# --- Payload Helpers ---
+def payload_size(audio):
+    """Size in bytes of a bytes-like object or a seekable binary file object."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return memoryview(audio).nbytes
+    if hasattr(audio, 'getbuffer'):
+        return audio.getbuffer().nbytes
+    position = audio.tell()
+    size = audio.seek(0, io.SEEK_END)
+    audio.seek(position)
+    return size
+
+
+def payload_digest(audio):
+    """SHA-256 of a payload (bytes-like, str or in-memory file object) without copying it."""
+    if isinstance(audio, str):
+        audio = audio.encode('ascii', errors='replace')
+    elif hasattr(audio, 'getbuffer'):
+        with audio.getbuffer() as view:
+            return hashlib.sha256(view).hexdigest()
+    elif not isinstance(audio, (bytes, bytearray, memoryview)):
+        position = audio.tell()
+        audio.seek(0)
+        digest = hashlib.sha256(audio.read()).hexdigest()
+        audio.seek(position)
+        return digest
+    return hashlib.sha256(audio).hexdigest()
+
+
+def decode_recorded_audio(audio_base64):
+    """Decode the recorder's base64 payload, rejecting oversized input before decoding it."""
+    if not audio_base64:
+        raise AudioRejected("L'audio enregistré est vide.")
+    if len(audio_base64) * 3 // 4 > MAX_AUDIO_BYTES:
+        raise AudioRejected(f"L'audio enregistré dépasse la taille maximale de {MAX_AUDIO_BYTES // (1024 * 1024)} Mo.")
+    try:
+        audio_bytes = base64.b64decode(audio_base64, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise AudioRejected(f"L'audio enregistré n'est pas un base64 valide : {e}") from e
+    if not audio_bytes:
+        raise AudioRejected("L'audio enregistré est vide après décodage Base64.")
+    return audio_bytes
+
+
+def audio_duration_seconds(audio, filename):
+    """Duration read from the container header when it is cheap to do so (WAV); None otherwise."""
+    if not filename.lower().endswith('.wav'):
+        return None
+    stream = io.BytesIO(audio) if isinstance(audio, (bytes, bytearray, memoryview)) else audio
+    position = stream.tell()
+    try:
+        with wave.open(stream, 'rb') as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+    finally:
+        stream.seek(position)
+
+
+def check_audio(audio, filename):
+    """Enforce the size and duration limits; returns the payload size in bytes."""
+    size = payload_size(audio)
+    if size == 0:
+        raise AudioRejected("Le fichier audio est vide.")
+    if size > MAX_AUDIO_BYTES:
+        raise AudioRejected(f"Le fichier audio dépasse la taille maximale de {MAX_AUDIO_BYTES // (1024 * 1024)} Mo.")
+    duration = audio_duration_seconds(audio, filename)
+    if duration is not None and duration > MAX_AUDIO_SECONDS:
+        raise AudioRejected(f"Le fichier audio dure {duration:.0f} s (maximum {MAX_AUDIO_SECONDS:.0f} s).")
+    return size
+
+
+@contextlib.contextmanager
+def spooled_audio_file(audio, suffix):
+    """Write the payload to a temporary file that is removed even if the caller fails."""
+    handle = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        with handle:
+            if isinstance(audio, (bytes, bytearray, memoryview)):
+                handle.write(audio)
+            else:
+                audio.seek(0)
+                handle.write(audio.read())
+        with open(handle.name, 'rb') as file:
+            yield file
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(handle.name)
+
+
+# --- Transcription ---
+def new_transcription_cache(max_entries=TRANSCRIPTION_CACHE_ENTRIES, max_bytes=TRANSCRIPTION_CACHE_BYTES):
+    """LRU of transcripts, capped by entry count and by the UTF-8 size of the stored text."""
+    return LRUCache(max_entries, max_bytes=max_bytes, sizeof=lambda text: len(text.encode('utf-8')))
+
+
+def transcription_key(audio, model, language, temperature):
+    """Content address of a transcription: audio hash plus the parameters that change the output."""
+    return f"{payload_digest(audio)}:{model}:{language}:{temperature}"
+
+
+def transcribe(client, audio, filename, language=TRANSCRIPTION_LANGUAGE, model=TRANSCRIPTION_MODEL,
+               temperature=0.0, cache=None, in_memory=TRANSCRIPTION_IN_MEMORY):
+    """
+    Transcribe `audio` (bytes-like or binary file object), uploaded straight from memory
+    unless `in_memory` is off. With a cache, audio already transcribed with the same
+    parameters is not re-sent. Returns the transcribed text.
+    """
+    check_audio(audio, filename)
+    key = transcription_key(audio, model, language, temperature) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        telemetry.increment('transcription_cache_lookups', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+    if hasattr(audio, 'seek'):
+        audio.seek(0)
+    request = dict(model=model, response_format="json", language=language, temperature=temperature)
+    with telemetry.timed('transcription_seconds', upload='memory' if in_memory else 'file'):
+        if in_memory:
+            text = client.audio.transcriptions.create(file=(filename, audio), **request).text
+        else:
+            logger.info("Audio written to a temporary file before upload (TRANSCRIPTION_IN_MEMORY off)",
+                        extra={'fields': {'filename': filename}})
+            with spooled_audio_file(audio, os.path.splitext(filename)[1]) as file:
+                text = client.audio.transcriptions.create(file=(filename, file), **request).text
+    if key is not None and text:
+        cache.put(key, text)
+    return text